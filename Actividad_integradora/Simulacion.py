@@ -1,8 +1,6 @@
 from mesa import Agent, Model # type: ignore
 from mesa.space import SingleGrid # type: ignore
 from mesa.time import SimultaneousActivation # type: ignore
-from mesa.visualization.modules import CanvasGrid # type: ignore
-from mesa.visualization.ModularVisualization import ModularServer # type: ignore
 import numpy as np
 
 def generar_celdas_aleatorias(ancho, alto, porcentaje_basura):
@@ -92,6 +90,10 @@ class ModeloLimpiadores(Model):
             self.contador_limpiadores += 1
 
 if __name__ == "__main__":
+    # El servidor de visualización solo se importa al lanzarlo, no al importar el modelo
+    from mesa.visualization.modules import CanvasGrid # type: ignore
+    from mesa.visualization.ModularVisualization import ModularServer # type: ignore
+
     def representacion_agente(agent):
         if isinstance(agent, Limpiador):
             return {"Shape": "circle", "Filled": "true", "Layer": 0, "Color": "red", "r": 0.5}
@@ -0,0 +1,72 @@
+import random
+import numpy as np
+
+# Números aleatorios basados en contador: cada sorteo es un hash (SplitMix64) de
+# (semilla, flujo, agente, paso, sorteo). No hay estado que avance, así que el resultado no depende
+# del orden en que se mueven los agentes, de si se calculan uno por uno o en lote con numpy, ni
+# de en qué proceso corren. Las versiones escalar y vectorizada dan exactamente los mismos valores.
+
+MASK = (1 << 64) - 1
+
+# Flujos: un propósito por flujo para que dos decisiones distintas nunca compartan sorteo
+STREAM_SPAWN = 1       # agente: número de coche; sorteo 0 origen, 1 destino
+STREAM_DETOUR = 2      # agente: número de coche; sorteo 0 si se desvía, 1 qué sucesor toma
+STREAM_LIGHT_TIE = 3   # agente: índice del primer semáforo del par
+STREAM_THRESHOLD = 4   # agente: índice del semáforo
+STREAM_DEMAND = 5      # un generador numpy por paso para las llegadas de demanda
+
+def new_seed() -> int:
+    return random.SystemRandom().getrandbits(63)
+
+def _mix(z: int) -> int:
+    z = (z + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+def draw_bits(seed, stream, agent, step, draw=0) -> int:
+    z = _mix(seed & MASK)
+    for part in (stream, agent, step, draw):
+        z = _mix(z ^ (part & MASK))
+    return z
+
+def uniform(seed, stream, agent, step, draw=0) -> float:
+    # En [0, 1) con 53 bits, como random.random()
+    return (draw_bits(seed, stream, agent, step, draw) >> 11) * 2.0 ** -53
+
+def randint(low, high, seed, stream, agent, step, draw=0) -> int:
+    # Entero en [low, high], ambos incluidos (como random.randint)
+    return low + int(uniform(seed, stream, agent, step, draw) * (high - low + 1))
+
+def choice(sequence, seed, stream, agent, step, draw=0):
+    return sequence[int(uniform(seed, stream, agent, step, draw) * len(sequence))]
+
+# Versiones vectorizadas: cualquier argumento puede ser un arreglo (se aplica broadcasting)
+_C1 = np.uint64(0x9E3779B97F4A7C15)
+_C2 = np.uint64(0xBF58476D1CE4E5B9)
+_C3 = np.uint64(0x94D049BB133111EB)
+
+def _mix_array(z: np.ndarray) -> np.ndarray:
+    z = z + _C1
+    z = (z ^ (z >> np.uint64(30))) * _C2
+    z = (z ^ (z >> np.uint64(27))) * _C3
+    return z ^ (z >> np.uint64(31))
+
+def _as_u64(value) -> np.ndarray:
+    # Negativos en complemento a dos, igual que `& MASK` en la versión escalar
+    return np.asarray(value, dtype=np.int64).astype(np.uint64)
+
+def draw_bits_array(seed, stream, agent, step, draw=0) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        z = _mix_array(np.uint64(seed & MASK))
+        for part in (stream, agent, step, draw):
+            z = _mix_array(z ^ _as_u64(part))
+    return z
+
+def uniform_array(seed, stream, agent, step, draw=0) -> np.ndarray:
+    return (draw_bits_array(seed, stream, agent, step, draw) >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+def step_generator(seed, stream, step) -> np.random.Generator:
+    # Para distribuciones que numpy ya sabe muestrear (Poisson, etc.): un generador propio por
+    # (semilla, flujo, paso), así que tampoco depende de lo que se sorteó antes
+    return np.random.default_rng([seed & MASK, stream, step])
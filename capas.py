@@ -0,0 +1,52 @@
+import numpy as np
+
+# Capas estáticas: tipo de celda (banderas), orientaciones (máscara) e id de estacionamiento
+KIND_EMPTY = 0
+KIND_STREET = 1
+KIND_BUILDING = 2
+KIND_PARKING = 4
+KIND_LIGHT = 8
+
+ORIENTATION_BITS = {"Right": 1, "Left": 2, "Up": 4, "Down": 8}
+
+# Movimientos en el mismo orden que los bits de orientación
+MOVES = [("Right", (1, 0)), ("Left", (-1, 0)), ("Up", (0, 1)), ("Down", (0, -1))]
+
+def orientation_mask(street_orientations) -> int:
+    mask = 0
+    for orientation in street_orientations:
+        mask |= ORIENTATION_BITS[orientation]
+    return mask
+
+def neighbour_cells(x, y, width, height) -> list[tuple[int, int]]:
+    neighbours = [(x + dx, y) for dx in [-1, 1] if 0 <= x + dx < width]
+    neighbours += [(x, y + dy) for dy in [-1, 1] if 0 <= y + dy < height]
+    return neighbours
+
+def parking_positions(parking_id: np.ndarray) -> list[tuple[int, int]]:
+    # Posiciones de los estacionamientos ordenadas por idParking (1, 2, ...)
+    cells = np.argwhere(parking_id > 0)
+    order = np.argsort(parking_id[cells[:, 0], cells[:, 1]], kind="stable")
+    return [(int(x), int(y)) for x, y in cells[order]]
+
+# Dirección en la que cada semáforo revisa la fila de coches que se acerca
+LOOK_BACK = {"Up": (0, -1), "Down": (0, 1), "Left": (-1, 0), "Right": (1, 0)}
+
+def sensing_window(positions, orientation, width, height, depth=3) -> list[tuple[int, int]]:
+    dx, dy = LOOK_BACK[orientation]
+    window = []
+    for x, y in positions:
+        for i in range(1, depth + 1):
+            if 0 <= x + dx * i < width and 0 <= y + dy * i < height:
+                window.append((x + dx * i, y + dy * i))
+    return window
+
+def sensing_windows(lights, width, height, depth=3) -> tuple[np.ndarray, np.ndarray]:
+    # Ventanas de todos los semáforos como índices planos (x * height + y) y el índice del
+    # semáforo dueño de cada celda: la cola de cada uno es un bincount sobre la ocupación
+    cells, owner = [], []
+    for index, (positions, orientation) in enumerate(lights):
+        for x, y in sensing_window(positions, orientation, width, height, depth):
+            cells.append(x * height + y)
+            owner.append(index)
+    return np.array(cells, dtype=np.int64), np.array(owner, dtype=np.int64)
@@ -1,136 +1,205 @@
 from mesa import Agent, Model # type: ignore
 from mesa.space import MultiGrid # type: ignore
 from mesa.time import SimultaneousActivation # type: ignore
-from mesa.visualization.modules import CanvasGrid # type: ignore
-from mesa.visualization.ModularVisualization import ModularServer # type: ignore
+import heapq
 import numpy as np
-import random
 from typing import Optional
 from math import sqrt
-
-def get_direction(current_pos, next_pos):
-    x_curr, y_curr = current_pos
-    x_next, y_next = next_pos
-    
-    if (x_next > x_curr) and (y_next == y_curr):
-        return "Right"
-    elif (x_next < x_curr) and (y_next == y_curr):
-        return "Left"
-    elif (x_next == x_curr) and (y_next > y_curr):
-        return "Up"
-    elif (x_next == x_curr) and (y_next < y_curr):
-        return "Down"
-
-def create_neighbor_direction_map(x, y, neighbors):
-    current_pos = (x, y)
-    neighbor_directions = {}
-
-    for neighbor_pos in neighbors:
-        direction = get_direction(current_pos, neighbor_pos)
-        neighbor_directions[neighbor_pos] = direction
-
-    return neighbor_directions
+from capas import KIND_STREET, KIND_BUILDING, KIND_PARKING, ORIENTATION_BITS, parking_positions, sensing_windows
+from mapa import load_map
+from rutas import (EDGE_LEGAL, EDGE_OPEN, EDGE_PARKING, GrafoCalles, GrafoTransiciones, TablaRutas, parking_reachability,
+                   spawn_pairs, unreachable_pairs)
+from planificador import PlanificadorDStar
+from trazas import Trazador, TRACE_OFF
+from senales import POLICIES, make_controller
+from exportador import ExportadorFrames
+from metricas import Metricas
+from demanda import DemandaOD
+from aleatorio import STREAM_SPAWN, STREAM_DETOUR, STREAM_LIGHT_TIE, STREAM_THRESHOLD, choice, new_seed, randint, uniform
+
+# Los agentes declaran __slots__ para sus propios atributos: en una ciudad grande hay cientos de
+# miles de Calle/Edificio y cada atributo en slot no ocupa lugar en el __dict__ de la instancia
 
 # Agente Objeto Edificio:
 class Edificio(Agent):
-    def __init__(self, unique_id, model):
-        super().__init__(unique_id, model)
-        self.next_state = None
+    __slots__ = ()
 
 # Agente Objeto Calle:
 class Calle(Agent):
-    def __init__(self, unique_id, model, street_orientations: list[str]):
+    __slots__ = ("street_orientations",)
+
+    def __init__(self, unique_id, model, street_orientations: tuple[str, ...]):
         super().__init__(unique_id, model)
-        self.next_state = None
         self.street_orientations = street_orientations
-        self.position = (0,0)
 
 # Agente Objeto Estacionamiento:
 class Estacionamiento(Agent):
+    __slots__ = ("idParking",)
+
     def __init__(self, unique_id, model, idParking):
         super().__init__(unique_id, model)
-        self.next_state = None
         self.idParking = idParking
         
 # Agente Semáforo:
 class Semaforo(Agent):
-    def __init__(self, unique_id, model, positions, orientation, initial_state="red"):
+    __slots__ = ("positions", "_state", "orientation", "index", "timer", "change_threshold")
+
+    def __init__(self, unique_id, model, positions, orientation, initial_state="red", index=0):
         super().__init__(unique_id, model)
         self.positions = positions 
-        self.state = initial_state
+        self._state = initial_state
         self.orientation = orientation
+        self.index = index  # posición en model.lista_semaforos
         self.timer = 0
-        self.change_threshold = random.randint(5, 15)
+        self.change_threshold = randint(5, 15, model.rng_seed, STREAM_THRESHOLD, index, 0)
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        # Un cambio de luz despierta a los coches dormidos que esperan este semáforo
+        if value != self._state:
+            self._state = value
+            self.model.wake_light(self.index)
 
     def contar_coches(self):
-        coches = 0
-        for pos in self.positions:
-            x, y = pos
-            if self.orientation == "Up":
-                casillas_a_revisar = [(x, y-i) for i in range(1, 4)]
-            elif self.orientation == "Down":
-                casillas_a_revisar = [(x, y+i) for i in range(1, 4)]
-            elif self.orientation == "Left":
-                casillas_a_revisar = [(x-i, y) for i in range(1, 4)]
-            elif self.orientation == "Right":
-                casillas_a_revisar = [(x+i, y) for i in range(1, 4)]
-
-            for casilla in casillas_a_revisar:
-                if self.model.grid.out_of_bounds(casilla):
-                    continue  # Ignora casillas fuera de la grid
-                agentes_en_casilla = self.model.grid.get_cell_list_contents(casilla)
-                coches += sum(isinstance(agente, Coche) for agente in agentes_en_casilla)
-
-        return coches
+        # Coches en las 3 casillas hacia atrás de cada celda del semáforo; el modelo calcula
+        # las colas de todos los semáforos juntas
+        return int(self.model.queue_lengths()[self.index])
 
 
 # Agente Coche:
 class Coche(Agent):
+    __slots__ = ("first_parking", "destination_parking", "planner", "departure_step", "serial", "asleep",
+                 "sleep_token", "last_successors")
+
     def __init__(self, unique_id, model, first_parking, destination_parking):
         super().__init__(unique_id, model)
-        self.next_state = None
+        self.sleep_token = 0
+        self.reset(unique_id, first_parking, destination_parking)
+
+    def reset(self, unique_id, first_parking, destination_parking):
+        # También sirve para reusar un coche que ya llegó (pool de coches del modelo)
+        self.unique_id = unique_id
         self.first_parking = first_parking
         self.destination_parking = destination_parking
-        self.curr_pos = first_parking
+        self.planner = None
+        self.departure_step = self.model.count_steps
+        # Número de coche (no unique_id, que depende de los agentes estáticos): llave de sus sorteos
+        self.serial = self.model.cars_created
+        self.model.cars_created += 1
+        self.asleep = False
+        self.last_successors = []
         
     def step(self):
+        if self.model.routing == "table" and self.follow_route():
+            return
+        if self.model.routing == "dstar" and self.follow_plan():
+            return
+
         x, y = self.pos
 
-        print(self.first_parking, 'FIRST')
-        print(self.destination_parking, 'DESTINATION')
         successorsList = successors(self, (x, y))
+        self.last_successors = successorsList
 
         unique_successors = set(successorsList)
         unique_successors_list = list(unique_successors)
-        print("Successors:", unique_successors_list)
 
 
         if unique_successors_list:
             unique_sorted_successors = sorted(unique_successors_list, key=lambda s: heuristic(s, self.destination_parking))        
-            print("Sorted Successors:", unique_successors_list)
-            if random.randint(0, 10) >= 7:
-                randomSuccessor = self.random.choice(successorsList)
+            self.model.tracer.decision(self.unique_id, self.pos, unique_sorted_successors[0], len(unique_successors_list))
+            seed, step = self.model.rng_seed, self.model.count_steps
+            if randint(0, 10, seed, STREAM_DETOUR, self.serial, step, 0) >= 7:
+                randomSuccessor = choice(successorsList, seed, STREAM_DETOUR, self.serial, step, 1)
                 unique_sorted_successors = [randomSuccessor]
                 
             for sorted_successor in unique_sorted_successors:
-                cell = self.model.grid.get_cell_list_contents([sorted_successor])
-                parking_objects = [agent for agent in cell if isinstance(agent, Estacionamiento)]
                 if goal_test(self, sorted_successor, self.destination_parking):
-                    self.model.grid.move_agent(self, sorted_successor)
-                    self.model.grid.remove_agent(self)
-                    self.model.schedule.remove(self)
+                    self.park(sorted_successor)
                     break
-                elif not parking_objects:
-                    streetlight_objects = [agent for agent in cell if isinstance(agent, Semaforo)]
-                    if streetlight_objects:
-                        light_object = streetlight_objects[0]
-                        if light_object.state == "green":
-                            self.model.grid.move_agent(self, sorted_successor)
-                            break
-                    else:
-                        self.model.grid.move_agent(self, sorted_successor)
+                elif not self.model.parking_id[sorted_successor]:
+                    if self.model.light_allows(sorted_successor):
+                        self.model.move_car(self, sorted_successor)
                         break
 
+    def wait_list(self):
+        # Para un coche que no se pudo mover: (celdas ocupadas, semáforos en rojo) que lo detienen,
+        # si con cualquier sorteo seguiría sin moverse mientras no se vacíe una de esas celdas ni
+        # cambie uno de esos semáforos. None si puede moverse solo (o si usa D* Lite, que guarda
+        # estado en cada paso). Que entre un coche a una celda nunca desbloquea a nadie
+        model = self.model
+        if model.routing == "dstar":
+            return None
+        if model.routing == "table":
+            next_cells = model.routes.next_moves(self.pos, self.destination_parking)
+            if next_cells:
+                lights = []
+                for cell in next_cells:
+                    if goal_test(self, cell, self.destination_parking):
+                        return None
+                    if not model.light_allows(cell):
+                        lights.append(int(model.light_index[cell]))
+                    elif not model.has_car(cell):
+                        return None
+                return [cell for cell in next_cells if model.has_car(cell)], lights
+
+        # Heurística: los sucesores dependen solo de la ocupación de las celdas vecinas y solo
+        # pueden aumentar cuando una de ellas se vacía
+        lights = []
+        for cell in set(self.last_successors):
+            if goal_test(self, cell, self.destination_parking):
+                return None
+            if model.parking_id[cell]:
+                continue
+            if model.light_allows(cell):
+                return None
+            lights.append(int(model.light_index[cell]))
+        positions, targets, _ = model.transitions.edges(self.pos)
+        occupancy = model.occupancy_flat
+        return [cell for cell, target in zip(positions, targets) if occupancy[target]], lights
+
+    def follow_route(self) -> bool:
+        # Sigue un camino más corto de la tabla de rutas; si la celda está ocupada o en rojo, espera
+        next_cells = self.model.routes.next_moves(self.pos, self.destination_parking)
+        if not next_cells:
+            return False
+
+        for next_cell in next_cells:
+            if goal_test(self, next_cell, self.destination_parking):
+                self.park(next_cell)
+                break
+            elif not self.model.has_car(next_cell) and self.model.light_allows(next_cell):
+                self.model.move_car(self, next_cell)
+                break
+        return True
+
+    def follow_plan(self) -> bool:
+        # Replaneación incremental (D* Lite): solo se repara el plan cuando cambia la ocupación vecina
+        if self.planner is None:
+            self.planner = PlanificadorDStar(self.model.street_graph, self.pos, self.destination_parking)
+        self.planner.observe(self.pos, self.model.has_car)
+        next_cell = self.planner.next_cell()
+        if next_cell is None:
+            return False
+
+        if goal_test(self, next_cell, self.destination_parking):
+            self.park(next_cell)
+        elif not self.model.has_car(next_cell) and self.model.light_allows(next_cell):
+            self.model.move_car(self, next_cell)
+        return True
+
+    def park(self, parking: tuple[int, int]):
+        # Al llegar al estacionamiento destino el coche sale de la simulación
+        trip_time = self.model.count_steps + 1 - self.departure_step
+        self.model.trip_times.append(trip_time)
+        self.model.tracer.arrival(self.unique_id, parking, trip_time)
+        if self.model.metrics is not None:
+            self.model.metrics.trip(self, self.model.count_steps + 1)
+        self.model.remove_car(self)
+
     def render(self):
         return {"First Parking": self.first_parking, "Destination": self.destination_parking}
             
@@ -141,46 +210,29 @@ def compare_by_heuristic(self, successor1: tuple[int, int], successor2: tuple[in
     return int(heuristic1 - heuristic2)
 
 def goal_test(self, coor: tuple[int, int], destination_parking: tuple[int, int]) -> bool:
-    cell_contents = self.model.grid.get_cell_list_contents([coor])
-    parking_objects = [agent for agent in cell_contents if isinstance(agent, Estacionamiento)]
-    if parking_objects:
+    if self.model.parking_id[coor]:
         if destination_parking == coor:
             return True
     return False
 
 def successors(self, coor: tuple[int, int]) -> list[tuple[int, int]]:
-    x, y = coor
-    neighbours = [(x + dx, y + dy) for dx in [-1, 1] for dy in [0] if 0 <= x + dx <= 23 and 0 <= y + dy <= 23] + [(x + dx, y + dy) for dx in [0] for dy in [-1, 1] if 0 <= x + dx <= 23 and 0 <= y + dy <= 23]
-    
+    # Aristas de la celda en el grafo de transiciones compilado y filtro por ocupación
+    positions, targets, flags = self.model.transitions.edges(coor)
+    occupancy = self.model.occupancy_flat
+    free = [not occupancy[target] for target in targets]
+
+    # Movimientos legales desde la celda actual según sus orientaciones
+    legal_moves = [neighbour for neighbour, flag, is_free in zip(positions, flags, free) if flag & EDGE_LEGAL and is_free]
+
     successors: list[tuple[int, int]] = []
 
-    for neighbour in neighbours:
-        next_x, next_y = neighbour
-
-        if 0 <= next_x < self.model.grid.width and 0 <= next_y < self.model.grid.height:
-            cell_contents = self.model.grid.get_cell_list_contents([(next_x, next_y)])
-            street_objects = [agent for agent in cell_contents if isinstance(agent, Calle)]
-            car_objects = [agent for agent in cell_contents if isinstance(agent, Coche)]
-            building_objects = [agent for agent in cell_contents if isinstance(agent, Edificio)]   
-            parking_objects = [agent for agent in cell_contents if isinstance(agent, Estacionamiento)]                     
-            # Agente actual
-            my_cell_contents = self.model.grid.get_cell_list_contents([(x, y)])
-            my_street_objects = [agent for agent in my_cell_contents if isinstance(agent, Calle)]
-
-            # Meter la condición de que si son Parking para que se pueda mandar en la lista de successors
-            if parking_objects:
-                successors.append(neighbour)
-
-            if not car_objects and not building_objects: # if street_objects and not car_objects and not building_objects:
-                    myListOrientations = my_street_objects[0].street_orientations
-                    neighbour_directions = create_neighbor_direction_map(x, y, neighbours)
-                    for direction in neighbour_directions:
-                        if neighbour_directions[direction] in myListOrientations:
-                            cell = self.model.grid.get_cell_list_contents([direction])
-                            street_objects = [agent for agent in cell if isinstance(agent, Calle)]
-                            car_objects = [agent for agent in cell if isinstance(agent, Coche)]
-                            if street_objects and not car_objects:
-                                successors.append(direction)
+    for neighbour, flag, is_free in zip(positions, flags, free):
+        # Meter la condición de que si son Parking para que se pueda mandar en la lista de successors
+        if flag & EDGE_PARKING:
+            successors.append(neighbour)
+
+        if flag & EDGE_OPEN and is_free:
+            successors.extend(legal_moves)
     return successors
 
 def heuristic(coor: tuple[int, int], destination_parking: tuple[int, int]) -> float:
@@ -191,601 +243,318 @@ def heuristic(coor: tuple[int, int], destination_parking: tuple[int, int]) -> fl
 
     return heuristic_value
 
-# Creación de coordenadas edificios
-def createBuilding(start_position, parkings: list[tuple[int, int]], widthB, heightB):
-    coordinates = [(start_position[0] + x, start_position[1] - y) for x in range(widthB) for y in range(heightB) 
-                if (start_position[0] + x, start_position[1] - y) not in parkings]
-    return coordinates
-
-#Creación de coordenadas calles
-def createStreet(start_position, widthS, heightS):
-    coordinates = [(start_position[0] + x, start_position[1] - y) for x in range(widthS) for y in range(heightS)]
-    return coordinates
-
-def agregarDireccion(coordinate, street_orientations):
-  listaRight = [(0, 0), (0, 1), (1, 0), (1, 1), (1, 8), (1, 9), (12,9),(15,9), (15, 16), (15, 17), (14, 16), (14, 17)]
-  listaUp = [(22, 0), (23, 0), (22, 1), (23, 1), (22, 22), (22, 23), (23, 22), (23, 23), (14, 1), (15, 1), (14, 22), (15, 22), (14, 23), (15, 23), (14,8),(15,8),(14,11), (5, 11), (6, 11), (5, 10), (6, 10), (18,10), (18, 11), (19, 10), (19, 11)]
-  listaDown = [(8, 17), (6, 1), (7, 1), (12, 1), (13, 1), (12, 22), (13, 22), (12, 23), (13, 23), (12, 0), (13, 0), (6, 0), (7, 0), (18, 22), (19, 22), (13,8),(13,11), (6, 8), (6, 9), (7, 8), (7, 9), (9, 22)]
-  listaLeft = [(1, 23), (1, 22), (22, 4), (23, 4), (22, 5), (23, 5), (22, 10), (22, 11), (23, 10), (23, 11), (12,11), (12,10),(15,10),(15,11), (15, 13), (15, 4), (15, 5), (12, 16), (12, 17), (13, 16), (13, 17)] 
-  if coordinate in listaRight:
-      street_orientations.append("Right")
-  elif coordinate in listaLeft:
-      street_orientations.append("Left")
-  elif coordinate in listaUp:
-      street_orientations.append("Up")
-  elif coordinate in listaDown:
-      street_orientations.append("Down")
+class CiudadEstatica:
+    # Lo que no cambia entre corridas de un mismo mapa y routing: mapa compilado, grafo de
+    # transiciones, pares con camino y, según el routing, grafo de calles y tabla de rutas.
+    # Nadie lo modifica durante una corrida (la tabla solo agrega filas), así que varios modelos
+    # pueden compartirlo; corridas.py guarda uno por (hash del mapa, routing) en cada proceso
+    def __init__(self, mapa, routing="heuristic"):
+        if routing not in ("heuristic", "table", "dstar"):
+            raise ValueError(f"Unknown routing: {routing}")
+        self.mapa = mapa
+        self.routing = routing
+        self.parking_lots = parking_positions(mapa.parking_id)
+        # Movimientos de cada celda compilados en CSR (sucesores de la heurística, análisis)
+        self.transitions = GrafoTransiciones(mapa.cell_kind, mapa.cell_orientation)
+        # Pares de estacionamientos con camino: los coches solo salen hacia un destino alcanzable
+        self.reachable = parking_reachability(self.transitions, [self.transitions.cell(pos) for pos in self.parking_lots])
+        origins, offsets, destinations = spawn_pairs(self.reachable)
+        self.spawn_origins = origins.tolist()
+        self.spawn_destinations = [destinations[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+        self.street_graph = GrafoCalles(mapa.cell_kind, mapa.cell_orientation) if routing != "heuristic" else None
+        self.routes = (TablaRutas(mapa.cell_kind, mapa.cell_orientation, mapa.parking_id, self.street_graph)
+                       if routing == "table" else None)
 
 class CiudadModel(Model):
-    def __init__(self, width, height, cars_number):
+    def __init__(self, width=None, height=None, cars_number=25, routing="heuristic", schedule_static=False,
+                 map_path=None, place_static=True, seed=None, trace_level=TRACE_OFF, trace_path=None,
+                 light_policy="queue", light_options=None, export_path=None, keyframe_every=100, metrics=False,
+                 skip_blocked=True, demand: Optional[DemandaOD] = None, static: Optional[CiudadEstatica] = None):
+        if routing not in ("heuristic", "table", "dstar"):
+            raise ValueError(f"Unknown routing: {routing}")
+        if light_policy not in POLICIES:
+            raise ValueError(f"Unknown light policy: {light_policy}")
+        # Todos los sorteos salen de aleatorio.py con llave (seed, flujo, agente, paso), así que la
+        # corrida no depende del orden de los agentes ni del proceso en que corre
+        self.rng_seed = seed if seed is not None else new_seed()
+
+        # La ciudad viene de un archivo de mapa (por defecto mapas/centro.json) ya compilado a arreglos;
+        # con static se reusa el mapa y las estructuras de otro modelo (map_path no se usa)
+        if static is not None and static.routing != routing:
+            raise ValueError(f"Static structures were built for routing {static.routing}, not {routing}")
+        if static is None:
+            static = CiudadEstatica(load_map(map_path), routing)
+        self.static = static
+        self.mapa = static.mapa
+        if (width, height) != (None, None) and (width, height) != (self.mapa.width, self.mapa.height):
+            raise ValueError(f"Map {self.mapa.name} is {self.mapa.width}x{self.mapa.height}, not {width}x{height}")
+        width, height = self.mapa.width, self.mapa.height
+
         self.grid = MultiGrid(width, height, False)
         self.schedule = SimultaneousActivation(self)
         self.running = True
+        self.routing = routing
+        self.light_policy = light_policy
+        self.light_options = light_options
+        # Calles, edificios, estacionamientos y semáforos no hacen nada en step()/advance(), así que
+        # viven en un registro aparte y el scheduler solo recorre coches (schedule_static=True
+        # los vuelve a meter al scheduler como antes)
+        self.schedule_static = schedule_static
+        self.static_agents = {}
         self.cars_number = cars_number
         self.id = 0
         self.total_cells = width * height
         self.count_steps = 0
+        self.cars_created = 0
+        self.trip_times = []
+        self.active_cars = 0
+        # Demanda continua (demanda.py): coches nuevos en cada paso; los que llegan se guardan en
+        # car_pool para reusarlos en lugar de crear objetos nuevos
+        self.demand = demand
+        self.car_pool = []
+        # Coches dormidos: un coche bloqueado deja de moverse hasta que cambie una celda o semáforo
+        # de los que espera. Los despiertos se recorren por número de coche (el orden de siempre)
+        self.skip_blocked = skip_blocked
+        self.awake_cars = []
+        self._current = None
+        self._current_serial = -1
+        self.cell_sleepers = {}
+        self.light_sleepers = {}
+        # Trazas por niveles (apagadas por defecto) en lugar de print() por coche
+        self.tracer = Trazador(trace_level, path=trace_path)
+        self.metrics = None
         self.lista_semaforos = []
-        
-        # Creación de calles
-        coorStreet1 = createStreet((0, 23), 2, 24) #Calle izquierda vertical
-        
-        for coordinate in coorStreet1:
-            street = Calle(self.id, self, ['Down'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
+        # Pares de semáforos (índices en lista_semaforos) que compiten por la misma intersección
+        self.pares_semaforos = list(self.mapa.light_pairs)
 
-        coorStreet2 = createStreet((2, 23), 22, 2) #Calle arriba horizontal
+        # Capas estáticas: calles, edificios, estacionamientos y semáforos no se mueven después
+        # de __init__, así que se leen del mapa compilado como arreglos indexados por [x, y]
+        self.cell_kind = self.mapa.cell_kind
+        self.cell_orientation = self.mapa.cell_orientation
+        self.parking_id = self.mapa.parking_id
+        self.light_index = self.mapa.light_index
+        self.parking_lots = static.parking_lots
 
-        for coordinate in coorStreet2:
-            street = Calle(self.id, self, ['Left'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-            
-        coorStreet3 = createStreet((2, 1), 22, 2)  #Calle abajo horizontal
+        # Los agentes Calle, Edificio y Estacionamiento solo hacen falta para visualizar
+        if place_static:
+            self.build_static_agents()
 
-        for coordinate in coorStreet3:
-            street = Calle(self.id, self, ['Right'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-
-        coorStreet4 = createStreet((22, 21), 2, 20)  #Calle derceha vertical
-
-        for coordinate in coorStreet4:
-            street = Calle(self.id, self, ['Up'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-
-        coorStreet5 = createStreet((2, 17), 10, 2)  #Calle pequeña horizontal izquierda
-
-        for coordinate in coorStreet5:
-            street = Calle(self.id, self, ['Left'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-            
-        coorStreet6 = createStreet((5, 15), 2, 4)  #Calle pequeña vertical izquierda
-
-        for coordinate in coorStreet6:
-            street = Calle(self.id, self, ['Up'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-            
-        coorStreet7 = createStreet((2, 9), 10, 2)  #Calle pequeña horizontal izquierda abajo 1
-
-        for coordinate in coorStreet7:
-            street = Calle(self.id, self, ['Right'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet8 = createStreet((2, 11), 10, 2)  #Calle pequeña horizontal izquierda abajo 2
-
-        for coordinate in coorStreet8:
-            street = Calle(self.id, self, ['Left'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet9 = createStreet((6, 7), 2, 6)  #Calle pequeña vertical izquierda abajo
-
-        for coordinate in coorStreet9:
-            street = Calle(self.id, self, ['Down'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-            
-        coorStreet10 = createStreet((12, 21), 2, 10)  #Calle central vertical izquierda arriba
-
-        for coordinate in coorStreet10:
-            street = Calle(self.id, self, ['Down'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet11 = createStreet((14, 21), 2, 10)  #Calle central vertical derecha arriba
-
-        for coordinate in coorStreet11:
-            street = Calle(self.id, self, ['Up'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet12 = createStreet((12, 7), 2, 6)  #Calle central vertical izquierda abajo
-
-        for coordinate in coorStreet12:
-            street = Calle(self.id, self, ['Down'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet13 = createStreet((14, 7), 2, 6)  #Calle central vertical derecha abajo
-
-        for coordinate in coorStreet13:
-            street = Calle(self.id, self, ['Up'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-
-        coorStreet14 = createStreet((16, 5), 6, 2)  #Calle pequeña horizontal derecha más abajo
-
-        for coordinate in coorStreet14:
-            street = Calle(self.id, self, ['Left'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet15 = createStreet((16, 9), 6, 2)  #Calle pequeña horizontal derecha abajo
-
-        for coordinate in coorStreet15:
-            street = Calle(self.id, self, ['Right'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-            
-        coorStreet16 = createStreet((16, 11), 6, 2)  #Calle pequeña horizontal derecha central
-
-        for coordinate in coorStreet16:
-            street = Calle(self.id, self, ['Left'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet17 = createStreet((16, 17), 6, 2)  #Calle pequeña horizonatl derecha arriba
-
-        for coordinate in coorStreet17:
-            street = Calle(self.id, self, ['Right'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-            
-        coorStreet18 = createStreet((18, 15), 2, 4)  #Calle vertical derecha central
-
-        for coordinate in coorStreet18:
-            street = Calle(self.id, self, ['Up'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        coorStreet19 = createStreet((18, 21), 2, 4)  #Calle vertical derecha arriba
-
-        for coordinate in coorStreet19:
-            street = Calle(self.id, self, ['Down'])
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-
-        
-        
-
-        # Agregar rotonda
-        def crearRotonda(coordinate, direction): 
-            street = Calle(self.id, self, direction)
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-        
-        crearRotonda((12, 11), ["Down", "Left"])
-        crearRotonda((12, 10), ["Down", "Left"])
-        crearRotonda((12, 9), ["Down", "Right"])
-        crearRotonda((12, 8), ["Down", "Right"])
-        crearRotonda((13, 11), ["Down", "Left"])
-        crearRotonda((13, 8), ["Down", "Right"])
-        crearRotonda((14, 11), ["Up", "Left"])
-        crearRotonda((14, 8), ["Up", "Right"])
-        crearRotonda((15, 11), ["Up", "Left"])
-        crearRotonda((15, 10), ["Up", "Left"])
-        crearRotonda((15, 9), ["Up", "Right"])
-        crearRotonda((15, 8), ["Up", "Right"])
-
-
-        # Crear calle para parking
-        def crearCalleParking(coordinate, direction): 
-            street = Calle(self.id, self, direction)
-            self.id += 1
-            self.pos = coordinate
-            self.grid.place_agent(street, coordinate)
-            self.schedule.add(street)
-            agregarDireccion(coordinate, street.street_orientations)
-
-        crearCalleParking((2,20), ["Left"])
-        crearCalleParking((6,18), ["Down"])
-        crearCalleParking((9,21), ["Up"])
-        crearCalleParking((11,19), ["Right"])
-        crearCalleParking((2,6), ["Left"])
-        crearCalleParking((5,3), ["Right"])
-        crearCalleParking((4,13), ["Right"])
-        crearCalleParking((8,15), ["Up"])
-        crearCalleParking((11,13), ["Right"])
-        crearCalleParking((8,3), ["Left"])
-        crearCalleParking((17,20), ["Right"])
-        crearCalleParking((20,19), ["Left"])
-        crearCalleParking((16,13), ["Left"])
-        crearCalleParking((17,6), ["Down"])
-        crearCalleParking((19,6), ["Down"])
-        crearCalleParking((19,3), ["Up"])
-        crearCalleParking((21,14), ["Right"])
-        
-        #Edificios
-        parkingsB1 =  [(2, 20), (6, 18), (9, 21), (11, 19)]
-        coordBuilding1 = createBuilding((2,21), [], 10, 4)
-
-        parkingsB2 =  [(2, 6), (5,3)]
-        coordBuilding2 = createBuilding((2,7), [], 4, 6)
-
-        parkingsB3 =  [(4, 13)]
-        coordBuilding3 = createBuilding((2,15), [], 3, 4)
-        
-        parkingsB4 =  [(8, 15), (11, 13)]
-        coordBuilding4 = createBuilding((7,15), [], 5, 4)
-
-        parkingsB5 =  [(8, 3)]
-        coordBuilding5 = createBuilding((8,7), [], 4, 6)
-
-        parkingsB6 =  [(17, 20)]
-        coordBuilding6 = createBuilding((16,21), [], 2, 4)
-
-        parkingsB7 =  [(20, 19)]
-        coordBuilding7 = createBuilding((20,21), [], 2, 4)
-        
-        parkingsB8 =  [(16, 13)]
-        coordBuilding8 = createBuilding((16,15), [], 2, 4)
-
-        parkingsB9 =  [(17, 6), (19,6)]
-        coordBuilding9 = createBuilding((16,7), [], 6, 2)
-        
-        parkingsB10 =  [(19, 3)]
-        coordBuilding10 = createBuilding((16,3), [], 6, 2)
-
-        parkingsB11 =  [(21, 14)]
-        coordBuilding11 = createBuilding((20,15), [], 2, 4)
-
-
-
-
-        #Glorieta
-
-        parkingsB12 = []
-        glorieta = createBuilding((13,10), parkingsB1, 2, 2)
-
-        #Semáforos
-        semaforop = []
-        semaforo = createBuilding((0,12), semaforop, 2, 1)
-        semaforo2 = createBuilding((2,11), semaforop, 1, 2)
-        semaforo3 = createBuilding((5,15), semaforop, 2, 1)
-        semaforo4 = createBuilding((7,17), semaforop, 1, 2)
-        semaforo5 = createBuilding((11,1), semaforop, 1, 2)
-        semaforo6 = createBuilding((12,2), semaforop, 2, 1)
-        semaforo7 = createBuilding((14,3), semaforop, 2, 1)
-        semaforo8 = createBuilding((14,21), semaforop, 2, 1)
-        semaforo9 = createBuilding((16,23), semaforop, 1, 2)
-        semaforo10 = createBuilding((16,5), semaforop, 1, 2)
-        semaforo11 = createBuilding((21,9), semaforop, 1, 2)
-        semaforo12 = createBuilding((22,7), semaforop, 2, 1)
-        
-        
-        for coordinate in coordBuilding1:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        contadorParking = 0
-        for parkingB1 in parkingsB1:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding2:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB2:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding3:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB3:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding4:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB4:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-
-        for coordinate in coordBuilding5:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-            
-        for parkingB1 in parkingsB5:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-
-        for coordinate in coordBuilding6:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB6:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding7:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB7:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding8:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB8:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding9:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB9:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-        
-        for coordinate in coordBuilding10:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB10:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-
-        for coordinate in coordBuilding11:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
-
-        for parkingB1 in parkingsB11:
-            contadorParking += 1
-            parking = Estacionamiento(self.id, self, contadorParking)
-            self.id += 1
-            self.grid.place_agent(parking, parkingB1)
-            self.schedule.add(parking)
-    
-        #Glorieta
-        for coordinate in glorieta:
-            building = Edificio(self.id, self)
-            self.id += 1
-            self.grid.place_agent(building, coordinate)
-            self.schedule.add(building)
         #Semáforo
-    
-        building = Semaforo(self.id, self, semaforo12, "Up")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo12:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo11, "Left")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo11:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo10, "Right")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo10:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo9, "Right")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo9:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo8, "Up")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo8:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo7, "Up")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo7:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
+        for positions, orientation in self.mapa.lights:
+            semaforo = Semaforo(self.id, self, positions, orientation, index=len(self.lista_semaforos))
+            self.lista_semaforos.append(semaforo)
+            self.id += 1
+            for pos in positions:
+                self.grid.place_agent(semaforo, pos)
+            self.register_static(semaforo)
+
+        # Estructuras compartibles (CiudadEstatica); unreachable_parkings() da los pares sin camino
+        self.transitions = static.transitions
+        self.reachable = static.reachable
+        self.spawn_origins = static.spawn_origins
+        self.spawn_destinations = static.spawn_destinations
+        if demand is not None:
+            self.demand = demand.restricted(self.reachable)  # copia propia del modelo
+        self.street_graph = static.street_graph
+        self.routes = static.routes
+
+        # Ocupación de coches (cuántos hay en cada celda y el id de uno de ellos)
+        # int32 como en MotorVectorizado: un estacionamiento de origen puede tener cientos de coches
+        self.occupancy = np.zeros((width, height), dtype=np.int32)
+        self.occupancy_flat = self.occupancy.reshape(-1)  # vista por índice plano x * height + y
+        self.car_id = np.full((width, height), -1, dtype=np.int32)
+        self.occupancy_version = 0
+
+        # Ventanas de conteo de los semáforos como índices planos sobre la ocupación
+        self.window_cells, self.window_owner = sensing_windows(self.mapa.lights, width, height)
+        self._queues = None
+        self._queues_version = -1
+        # Coches que salieron de las celdas de cada semáforo (cruces de la intersección)
+        self.light_crossings = np.zeros(len(self.lista_semaforos), dtype=np.int64)
 
-        building = Semaforo(self.id, self, semaforo6, "Down")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo6:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo5, "Left")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo5:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo4, "Right")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo4:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo3, "Up")
-        self.lista_semaforos.append(building)
+        # The starting car coordinates are the same as the parking coordinates
+        # Origen uniforme entre los estacionamientos con salida y destino uniforme entre los que
+        # alcanza (si todos los pares tienen camino: entre todos los demás, como siempre)
+        if cars_number and not self.spawn_origins:
+            raise ValueError(f"No parking on map {self.mapa.name} can reach another parking")
+        for _ in range(cars_number):
+            origin = choice(self.spawn_origins, self.rng_seed, STREAM_SPAWN, self.cars_created, self.count_steps, 0)
+            destination = choice(self.spawn_destinations[origin], self.rng_seed, STREAM_SPAWN, self.cars_created,
+                                 self.count_steps, 1)
+            self.spawn_car(self.parking_lots[origin], self.parking_lots[destination])
+
+        # Control de semáforos: "queue" (la regla original), "fixed", "actuated" o "max_pressure"
+        self.signals = make_controller(light_policy, self, **(light_options or {}))
+
+        # Flujo de cuadros para Unity: mapa una vez y después solo coches y semáforos que cambian
+        self.exporter = ExportadorFrames(self, open(export_path, "wb"), keyframe_every) if export_path else None
+
+        # Métricas por paso, por viaje y mapa de calor (apagadas por defecto)
+        self.metrics = Metricas(self) if metrics else None
+
+    def build_static_agents(self):
+        # Las calles con las mismas orientaciones comparten una sola tupla
+        orientation_names = {mask: tuple(name for name, bit in ORIENTATION_BITS.items() if mask & bit)
+                             for mask in np.unique(self.cell_orientation).tolist()}
+        xs, ys = np.nonzero(self.cell_kind)
+        cells = zip(xs.tolist(), ys.tolist(), self.cell_kind[xs, ys].tolist(),
+                    self.cell_orientation[xs, ys].tolist(), self.parking_id[xs, ys].tolist())
+        for x, y, kind, orientation, parking in cells:
+            pos = (x, y)
+            if kind & KIND_STREET:
+                self.place_static(Calle(self.id, self, orientation_names[orientation]), pos)
+            if kind & KIND_BUILDING:
+                self.place_static(Edificio(self.id, self), pos)
+            if kind & KIND_PARKING:
+                self.place_static(Estacionamiento(self.id, self, parking), pos)
+
+    def place_static(self, agent, pos: tuple[int, int]):
         self.id += 1
-        for pos in semaforo3:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-
-        building = Semaforo(self.id, self, semaforo2, "Right")
-        self.lista_semaforos.append(building)
+        self.grid.place_agent(agent, pos)
+        self.register_static(agent)
+
+    def register_static(self, agent):
+        self.static_agents[agent.unique_id] = agent
+        if self.schedule_static:
+            self.schedule.add(agent)
+
+    # Toda entrada, movimiento o salida de un coche pasa por place_car/move_car/remove_car
+    # para mantener la ocupación al día
+    def spawn_car(self, origin: tuple[int, int], destination: tuple[int, int]):
+        if self.car_pool:
+            car = self.car_pool.pop()
+            car.reset(self.id, origin, destination)
+        else:
+            car = Coche(self.id, self, origin, destination)
         self.id += 1
-        for pos in semaforo2:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
+        self.tracer.spawn(car.unique_id, car.first_parking, car.destination_parking)
+        self.place_car(car, origin)
+        return car
+
+    def place_car(self, car, pos: tuple[int, int]):
+        self.grid.place_agent(car, pos)
+        self.schedule.add(car)
+        self._occupy(car, pos)
+        self.active_cars += 1
+        if self.skip_blocked:
+            self._schedule_awake(car)
+
+    def move_car(self, car, pos: tuple[int, int]):
+        self.tracer.move(car.unique_id, car.pos, pos)
+        light = self.light_index[car.pos]
+        if light >= 0 and self.light_index[pos] != light:
+            self.light_crossings[light] += 1
+        self._vacate(car)
+        self.grid.move_agent(car, pos)
+        self._occupy(car, pos)
+
+    def remove_car(self, car):
+        self._vacate(car)
+        self.grid.remove_agent(car)
+        self.schedule.remove(car)
+        self.active_cars -= 1
+        if self.demand is not None:
+            self.car_pool.append(car)
+
+    def _occupy(self, car, pos: tuple[int, int]):
+        self.occupancy[pos] += 1
+        self.occupancy_version += 1
+        self.car_id[pos] = car.unique_id
+
+    def _vacate(self, car):
+        pos = car.pos
+        self.occupancy[pos] -= 1
+        self.occupancy_version += 1
+        if not self.occupancy[pos]:
+            self.car_id[pos] = -1
+        elif self.car_id[pos] == car.unique_id:
+            # Solo pasa en estacionamientos de origen compartidos por varios coches
+            self.car_id[pos] = next(agent.unique_id for agent in self.grid.get_cell_list_contents([pos])
+                                    if isinstance(agent, Coche) and agent is not car)
+        if self.cell_sleepers:
+            self.wake_cell(pos)
+
+    def _schedule_awake(self, car):
+        # Si el paso va antes de este coche, se mueve en este mismo paso; si no, en el siguiente
+        if self._current is not None and car.serial > self._current_serial:
+            heapq.heappush(self._current, (car.serial, car))
+        else:
+            self.awake_cars.append((car.serial, car))
+
+    def sleep(self, car, cells, lights):
+        car.asleep = True
+        car.sleep_token += 1
+        for cell in cells:
+            self.cell_sleepers.setdefault(cell, []).append((car, car.sleep_token))
+        for light in lights:
+            self.light_sleepers.setdefault(light, []).append((car, car.sleep_token))
+
+    def _wake(self, sleepers):
+        # Las entradas viejas (el coche ya despertó por otra celda o semáforo) se ignoran
+        for car, token in sleepers:
+            if car.asleep and car.sleep_token == token:
+                car.asleep = False
+                self._schedule_awake(car)
+
+    def wake_cell(self, pos):
+        sleepers = self.cell_sleepers.pop(pos, None)
+        if sleepers:
+            self._wake(sleepers)
+
+    def wake_light(self, index):
+        sleepers = self.light_sleepers.pop(index, None)
+        if sleepers:
+            self._wake(sleepers)
+
+    def step_cars(self):
+        # Como schedule.step(), en el mismo orden, pero solo con los coches despiertos. La lista
+        # casi siempre ya viene ordenada; los que despiertan a mitad del paso van en un heap aparte
+        order, self.awake_cars = self.awake_cars, []
+        order.sort()
+        self._current = woken = []
+        index = 0
+        while True:
+            if woken and (index == len(order) or woken[0][0] < order[index][0]):
+                serial, car = heapq.heappop(woken)
+            elif index < len(order):
+                serial, car = order[index]
+                index += 1
+            else:
+                break
+            self._current_serial = serial
+            pos = car.pos
+            car.step()
+            if car.pos is None:
+                continue  # se estacionó
+            waiting_on = car.wait_list() if car.pos == pos else None
+            if waiting_on is None:
+                self.awake_cars.append((serial, car))
+            else:
+                self.sleep(car, *waiting_on)
+        self._current = None
+        self._current_serial = -1
+        self.schedule.steps += 1
+        self.schedule.time += 1
+
+    def unreachable_parkings(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        return unreachable_pairs(self.reachable, self.parking_lots)
+
+    def has_car(self, pos: tuple[int, int]) -> bool:
+        return self.occupancy[pos] > 0
+
+    def queue_lengths(self) -> np.ndarray:
+        # Colas de todos los semáforos en un solo gather/sum; se recalculan solo si algún coche
+        # entró, se movió o salió desde la última vez
+        if self._queues_version != self.occupancy_version:
+            counts = self.occupancy.ravel()[self.window_cells]
+            self._queues = np.bincount(self.window_owner, weights=counts, minlength=len(self.lista_semaforos)).astype(np.int64)
+            self._queues_version = self.occupancy_version
+        return self._queues
+
+    def light_allows(self, pos: tuple[int, int]) -> bool:
+        light_index = self.light_index[pos]
+        return light_index < 0 or self.lista_semaforos[light_index].state == "green"
 
-        building = Semaforo(self.id, self, semaforo, "Down")
-        self.lista_semaforos.append(building)
-        self.id += 1
-        for pos in semaforo:
-            self.grid.place_agent(building, pos)
-        self.schedule.add(building)
-    
-        # The starting car coordinates are the same as the parking coordinates
-        for _ in range(cars_number):
-            # starting_parking = self.random.choice(parkingsB1)
-            # destination_parking = starting_parking
-            # while destination_parking == starting_parking:
-            #     destination_parking = self.random.choice(parkingB1)
-
-            parking_lots = [(2, 20), (6, 18), (9, 21), (11, 19), (2, 6), (5, 3), (4, 13), (8, 15), (11, 13), (8, 3),
-                            (17, 20), (20, 19), (16, 13), (17, 6), (19, 6), (19, 3), (21, 14)]
-
-            starting_parking = self.random.choice(parking_lots)
-            parking_lots.remove(starting_parking)
-            destination_parking = self.random.choice(parking_lots)
-            car = Coche(self.id, self, starting_parking, destination_parking)
-            # car = Coche(self.id, self, (19, 6), (17, 6))
-            self.id += 1
-            print('Car: ', car.unique_id, 'origin: ', car.first_parking)
-            print('Car: ', car.unique_id, 'destination: ', car.destination_parking)
-            self.grid.place_agent(car, starting_parking)
-            # self.grid.place_agent(car, (19, 6))
-            self.schedule.add(car)   
     def comparar_semaforos(self, semaforo1, semaforo2):
         coches1 = semaforo1.contar_coches()
         coches2 = semaforo2.contar_coches()
@@ -800,70 +569,66 @@ class CiudadModel(Model):
             semaforo1.state = "red"
             semaforo2.state = "red"
         else:
-            if random.choice([True, False]):
+            if uniform(self.rng_seed, STREAM_LIGHT_TIE, semaforo1.index, self.count_steps) < 0.5:
                 semaforo1.state = "green"
                 semaforo2.state = "red"
             else:
                 semaforo1.state = "red"
                 semaforo2.state = "green"
     def step(self):
-        self.schedule.step()
+        if self.demand is not None:
+            self.demand.step(self)
+        if self.skip_blocked:
+            self.step_cars()
+        else:
+            self.schedule.step()
         self.count_steps += 1
-        self.comparar_semaforos(self.lista_semaforos[11], self.lista_semaforos[10])
-        self.comparar_semaforos(self.lista_semaforos[9], self.lista_semaforos[8])
-        self.comparar_semaforos(self.lista_semaforos[7], self.lista_semaforos[6])
-        self.comparar_semaforos(self.lista_semaforos[5], self.lista_semaforos[2])
-        self.comparar_semaforos(self.lista_semaforos[3], self.lista_semaforos[4])
-        self.comparar_semaforos(self.lista_semaforos[1], self.lista_semaforos[0])
+        self.signals.step(self.count_steps)
+        if self.exporter is not None:
+            self.exporter.write_frame()
+        if self.metrics is not None:
+            self.metrics.end_step()
+        self.tracer.end_step(self.active_cars)
+
+    def close(self):
+        # Al terminar la corrida: escribe los eventos de traza que quedan en el buffer y cierra el
+        # flujo de cuadros. Sin esto, una corrida corta (o el final de cualquiera) no llega al archivo
+        self.tracer.flush()
+        if self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 if __name__ == "__main__":   
-    def agent_portrayal(agent):
-        if isinstance(agent, Coche):
-            portrayal = {"Shape": "circle",
-                        "Filled": "true",
-                        "Layer": 1,
-                        "Color": "purple",
-                        "r": 1}
-        elif isinstance(agent, Edificio):
-            portrayal = {"Shape": "rect",
-                        "Filled": "true",
-                        "Layer": 1,
-                        "Color": "blue",
-                        "w": 1,
-                        "h": 1}
-        elif isinstance(agent, Estacionamiento):
-            portrayal = {"Shape": "rect",
-                        "Filled": "true",
-                        "Layer": 1,
-                        "Color": "yellow",
-                        "w": 1,
-                        "h": 1}
-        elif isinstance(agent, Calle):
-            portrayal = {"Shape": "circle",
-                        "Filled": "true",
-                        "Layer": 1,
-                        "Color": "black",
-                        "r": 0.5}
-        elif isinstance(agent, Semaforo):
-            color = "green" if agent.state == "green" else "red"
-            portrayal = {"Shape": "rect",
-                        "Filled": "true",
-                        "Layer": 1,
-                        "Color": color,
-                        "w": 1,
-                        "h": 1}
-
-        return portrayal
+    # La visualización (Tornado) solo se importa al lanzar el servidor: los procesos que solo
+    # corren el modelo (corridas.py, determinismo.py, particion.py) no la cargan
+    import argparse
+    from mesa.visualization.modules import CanvasGrid # type: ignore
+    from mesa.visualization.ModularVisualization import ModularServer # type: ignore
+    from visualizacion import CanvasCiudad, agent_portrayal
+    parser = argparse.ArgumentParser(description="Servidor de visualización de la ciudad")
+    parser.add_argument("--full-grid", action="store_true",
+                        help="CanvasGrid de Mesa: agentes estáticos y un portrayal por agente en cada cuadro")
+    args = parser.parse_args()
 
     width = 24
     height = 24
     cars_number = 25
-    grid = CanvasGrid(agent_portrayal, width, height, 500, 500)
+    # Por defecto el fondo se manda una vez y cada cuadro solo lleva coches y semáforos que cambian
+    if args.full_grid:
+        grid = CanvasGrid(agent_portrayal, width, height, 500, 500)
+    else:
+        grid = CanvasCiudad(width, height, 500, 500)
     server = ModularServer(CiudadModel,
                         [grid],
                         "Ciudad con SMA",
                         {"width":width, "height":height, 
-                        "cars_number" : cars_number})
+                        "cars_number" : cars_number, "place_static": args.full_grid})
     server.port = 8521 # The default
     server.launch()
 
@@ -0,0 +1,98 @@
+import argparse
+import csv
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from ciudad import CiudadEstatica, CiudadModel
+from mapa import load_map, source_hash
+
+# Corridas sin interfaz: N semillas x combinaciones de parámetros de CiudadModel repartidas en
+# un pool de procesos. Cada tarea es una configuración con un bloque de semillas; cada proceso
+# guarda el mapa compilado y sus estructuras estáticas (grafos, alcanzabilidad, tabla de rutas)
+# por (hash del mapa, routing), así que las semillas de una misma configuración no las reconstruyen.
+
+_MAPS = {}
+_STATIC = {}
+
+def static_city(map_path, routing) -> CiudadEstatica:
+    map_hash = source_hash(map_path)
+    if map_hash not in _MAPS:
+        _MAPS[map_hash] = load_map(map_path)
+    if (map_hash, routing) not in _STATIC:
+        _STATIC[map_hash, routing] = CiudadEstatica(_MAPS[map_hash], routing)
+    return _STATIC[map_hash, routing]
+
+def expand_grid(grid: dict) -> list[dict]:
+    # {"cars_number": [25, 50], "routing": ["table"]} -> lista de configuraciones
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_one(config: dict, seed: int, max_steps: int) -> dict:
+    start = time.perf_counter()
+    options = dict(config)
+    static = static_city(options.pop("map_path", None), options.get("routing", "heuristic"))
+    max_queue = 0
+    with CiudadModel(seed=seed, place_static=False, static=static, **options) as model:
+        while model.count_steps < max_steps and model.active_cars:
+            model.step()
+            max_queue = max([max_queue] + [semaforo.contar_coches() for semaforo in model.lista_semaforos])
+    elapsed = time.perf_counter() - start
+
+    steps = model.count_steps
+    arrivals = len(model.trip_times)
+    return dict(config, seed=seed, steps=steps, arrivals=arrivals,
+                remaining=model.active_cars,
+                mean_trip_time=float(np.mean(model.trip_times)) if arrivals else float("nan"),
+                arrivals_per_step=arrivals / steps if steps else 0.0,
+                max_queue=max_queue, crossings_per_step=float(model.signals.throughput().sum()), seconds=elapsed,
+                steps_per_second=steps / elapsed if elapsed else 0.0)
+
+def run_chunk(config: dict, seeds: list[int], max_steps: int) -> list[dict]:
+    return [run_one(config, seed, max_steps) for seed in seeds]
+
+def run_replications(grid: dict, seeds, max_steps=500, processes=None, chunk_size=8) -> list[dict]:
+    seeds = list(seeds)
+    tasks = [(config, seeds[i:i + chunk_size]) for config in expand_grid(grid) for i in range(0, len(seeds), chunk_size)]
+    rows = []
+    if processes == 1:
+        for config, chunk in tasks:
+            rows += run_chunk(config, chunk, max_steps)
+    else:
+        # Cada mapa se compila una vez aquí, antes del pool: con la caché fría los procesos la
+        # escribirían todos al mismo tiempo
+        maps = {source_hash(config.get("map_path")): config.get("map_path") for config, _ in tasks}
+        for map_path in maps.values():
+            load_map(map_path)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(run_chunk, config, chunk, max_steps) for config, chunk in tasks]
+            for future in as_completed(futures):
+                rows += future.result()
+    # Tabla única, ordenada por configuración y semilla sin importar qué proceso terminó primero
+    names = list(grid)
+    rows.sort(key=lambda row: tuple(str(row[name]) for name in names) + (row["seed"],))
+    return rows
+
+def write_table(rows: list[dict], path: str):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réplicas de CiudadModel en paralelo, sin servidor")
+    parser.add_argument("--cars", type=int, nargs="+", default=[25])
+    parser.add_argument("--maps", nargs="+", default=[None])
+    parser.add_argument("--routing", nargs="+", default=["heuristic"])
+    parser.add_argument("--light-policy", nargs="+", default=["queue"])
+    parser.add_argument("--seeds", type=int, default=10)
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("-o", "--output", default="resultados.csv")
+    args = parser.parse_args()
+
+    grid = {"cars_number": args.cars, "map_path": args.maps, "routing": args.routing, "light_policy": args.light_policy}
+    rows = run_replications(grid, range(args.first_seed, args.first_seed + args.seeds), args.steps, args.processes)
+    write_table(rows, args.output)
+    print(f"{len(rows)} corridas -> {args.output}")
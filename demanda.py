@@ -0,0 +1,81 @@
+import copy
+import math
+import numpy as np
+from aleatorio import STREAM_DEMAND, step_generator
+
+# Demanda continua: en cada paso salen coches nuevos con llegadas de Poisson según una matriz
+# origen-destino sobre los idParking (fila/columna i es el estacionamiento con idParking i + 1).
+# La matriz da coches por paso; un perfil multiplica esas tasas según el paso (horas pico).
+
+class DemandaOD:
+    def __init__(self, od_matrix, profile=None):
+        od_matrix = np.asarray(od_matrix, dtype=np.float64)
+        if od_matrix.ndim != 2 or od_matrix.shape[0] != od_matrix.shape[1]:
+            raise ValueError("The OD matrix must be square (parkings x parkings)")
+        if (od_matrix < 0).any() or np.diagonal(od_matrix).any():
+            raise ValueError("OD rates must be non-negative with a zero diagonal")
+        self.od_matrix = od_matrix
+        self.profile = profile if profile is not None else (lambda step: 1.0)
+        self.origins, self.destinations = np.nonzero(od_matrix)
+        self.rates = od_matrix[self.origins, self.destinations]
+        self.spawned = 0
+        self.dropped = 0
+
+    def restricted(self, reachable: np.ndarray) -> "DemandaOD":
+        # Copia sin las tasas de los pares sin camino (CiudadModel la pide con model.reachable); los
+        # coches de esos pares nunca llegarían y solo gastarían pasos. La original no cambia, así
+        # que se puede pasar a varios modelos y cada uno cuenta sus propios coches
+        if len(self.od_matrix) != len(reachable):
+            raise ValueError(f"OD matrix is {len(self.od_matrix)}x{len(self.od_matrix)} but the map has "
+                             f"{len(reachable)} parkings")
+        keep = reachable[self.origins, self.destinations]
+        demand = copy.copy(self)
+        demand.origins, demand.destinations, demand.rates = self.origins[keep], self.destinations[keep], self.rates[keep]
+        demand.dropped = int(np.count_nonzero(~keep))
+        demand.spawned = 0
+        return demand
+
+    def arrivals(self, seed: int, step: int) -> list[tuple[int, int]]:
+        # Pares (origen, destino) como índices de estacionamiento, en orden de la matriz
+        counts = step_generator(seed, STREAM_DEMAND, step).poisson(self.rates * self.profile(step))
+        pairs = np.repeat(np.arange(len(self.rates)), counts)
+        return list(zip(self.origins[pairs].tolist(), self.destinations[pairs].tolist()))
+
+    def step(self, model):
+        # Llamar al inicio de model.step(): los coches nuevos se mueven en ese mismo paso
+        if len(self.od_matrix) != len(model.parking_lots):
+            raise ValueError(f"OD matrix is {len(self.od_matrix)}x{len(self.od_matrix)} but the map has "
+                             f"{len(model.parking_lots)} parkings")
+        for origin, destination in self.arrivals(model.rng_seed, model.count_steps):
+            model.spawn_car(model.parking_lots[origin], model.parking_lots[destination])
+            self.spawned += 1
+
+def uniform_od(parkings: int, cars_per_step: float) -> np.ndarray:
+    # Misma tasa para todos los pares distintos, sumando cars_per_step por paso
+    if parkings < 2:
+        raise ValueError("Uniform demand needs at least two parkings")
+    matrix = np.full((parkings, parkings), cars_per_step / (parkings * (parkings - 1)))
+    np.fill_diagonal(matrix, 0.0)
+    return matrix
+
+def piecewise_profile(breakpoints, period=None):
+    # breakpoints: [(paso de inicio, factor), ...] ordenados; con period el perfil se repite
+    starts = [start for start, _ in breakpoints]
+    factors = [factor for _, factor in breakpoints]
+    if not starts or starts != sorted(starts):
+        raise ValueError("Profile breakpoints must be a non-empty list sorted by step")
+
+    def profile(step):
+        if period:
+            step %= period
+        index = np.searchsorted(starts, step, side="right") - 1
+        return factors[index] if index >= 0 else 1.0
+    return profile
+
+def rush_hour_profile(day_length, peaks=((0.33, 0.05, 3.0), (0.75, 0.05, 3.0)), base=1.0):
+    # Día de day_length pasos con picos gaussianos: (centro, ancho, altura) como fracción del día
+    def profile(step):
+        t = (step % day_length) / day_length
+        return base + sum((height - base) * math.exp(-0.5 * ((t - center) / width) ** 2)
+                          for center, width, height in peaks)
+    return profile
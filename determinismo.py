@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from aleatorio import STREAM_DETOUR, uniform, uniform_array
+from ciudad import CiudadModel, Coche
+from generador import generar_ciudad
+from instantaneas import load_snapshot, save_snapshot
+from mapa import DEFAULT_MAP, load_map
+from motor import MotorVectorizado
+from particion import MotorParticionado
+
+# Trazas doradas: huella (sha256) de las posiciones de todos los coches y el estado de los semáforos
+# en cada paso, para varias configuraciones. Sirve para revisar que una corrida da lo mismo sin
+# importar el estado del módulo random, el proceso en que corre o si se restauró de una instantánea,
+# y para detectar cambios de comportamiento contra las huellas guardadas en GOLDEN_PATH.
+
+GOLDEN_PATH = Path(__file__).resolve().parent / "trazas_doradas.json"
+STEPS = 150
+CONFIGS = [dict(routing=routing, light_policy=policy, seed=seed)
+           for routing in ("heuristic", "table", "dstar")
+           for policy in ("queue", "actuated")
+           for seed in (0, 1)]
+GENERATED = dict(routing="heuristic", light_policy="max_pressure", seed=0, generated=40)
+
+def config_name(config: dict) -> str:
+    return ",".join(f"{name}={value}" for name, value in config.items())
+
+def build(config: dict) -> CiudadModel:
+    config = dict(config)
+    size = config.pop("generated", None)
+    map_path = generar_ciudad(size, size, seed=0) if size else None
+    return CiudadModel(cars_number=40, map_path=map_path, place_static=False, **config)
+
+def state_bytes(model) -> bytes:
+    cars = sorted((car.serial, car.pos[0], car.pos[1]) for car in model.schedule.agents if isinstance(car, Coche))
+    lights = [semaforo.state == "green" for semaforo in model.lista_semaforos]
+    return np.array(cars, dtype=np.int32).tobytes() + np.array(lights, dtype=np.uint8).tobytes()
+
+def golden_trace(model, steps=STEPS) -> str:
+    digest = hashlib.sha256(state_bytes(model))
+    for _ in range(steps):
+        model.step()
+        digest.update(state_bytes(model))
+    return digest.hexdigest()
+
+def config_trace(config: dict) -> str:
+    return golden_trace(build(config))
+
+def all_configs() -> list[dict]:
+    return CONFIGS + [GENERATED]
+
+def check_global_random(config) -> bool:
+    # El módulo random del proceso no debe influir
+    random.seed(1234)
+    np.random.seed(1234)
+    first = config_trace(config)
+    random.seed(99)
+    np.random.seed(99)
+    return first == config_trace(config)
+
+def check_processes(traces: dict) -> bool:
+    with ProcessPoolExecutor() as pool:
+        parallel = list(pool.map(config_trace, all_configs()))
+    return parallel == [traces[config_name(config)] for config in all_configs()]
+
+def check_snapshot(config, split=STEPS // 3) -> bool:
+    # Correr de corrido contra guardar a mitad, restaurar y seguir
+    straight = build(config)
+    for _ in range(split):
+        straight.step()
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "instantanea.npz"
+        save_snapshot(straight, path)
+        restored = load_snapshot(path)
+    return golden_trace(straight, STEPS - split) == golden_trace(restored, STEPS - split)
+
+def check_vectorized_draws() -> bool:
+    # Sorteos uno por uno contra el mismo sorteo en lote
+    agents, steps = np.arange(200), np.arange(50)[:, None]
+    batch = uniform_array(7, STREAM_DETOUR, agents, steps, 1)
+    return all(batch[step, agent] == uniform(7, STREAM_DETOUR, agent, step, 1)
+               for step in range(50) for agent in range(200))
+
+def check_engine_spawn(config) -> bool:
+    # El motor vectorizado saca los mismos orígenes y destinos que el modelo con la misma semilla
+    model = build(config)
+    engine = MotorVectorizado(model.cell_kind, model.cell_orientation, model.parking_id, model.light_index,
+                              model.mapa.lights, model.pares_semaforos, seed=model.rng_seed)
+    engine.spawn(model.cars_number)
+    cars = sorted((car for car in model.schedule.agents if isinstance(car, Coche)), key=lambda car: car.serial)
+    return all(engine.routes.parkings[engine.destination[index]] == car.destination_parking
+               and engine.pos[index] == car.pos[0] * model.grid.height + car.pos[1]
+               for index, car in enumerate(cars))
+
+def check_crowded_parking(cars_number=6000, steps=5) -> bool:
+    # Más de 255 coches en un mismo estacionamiento de origen: la ocupación debe seguir contando bien
+    model = CiudadModel(cars_number=cars_number, place_static=False, seed=0)
+    for _ in range(steps + 1):
+        counts = np.zeros(model.occupancy.shape, dtype=np.int64)
+        for car in model.schedule.agents:
+            if isinstance(car, Coche):
+                counts[car.pos] += 1
+        if counts.max() <= 255 or not np.array_equal(counts, model.occupancy):
+            return False
+        model.step()
+    return True
+
+def check_damaged_map_cache() -> bool:
+    # Una caché truncada o vacía (otro proceso escribiendo, disco lleno) se vuelve a compilar
+    reference = load_map(DEFAULT_MAP, cache_dir=None)
+    with tempfile.TemporaryDirectory() as directory:
+        load_map(DEFAULT_MAP, cache_dir=directory)
+        (cache_path,) = Path(directory).glob("*.npz")
+        full = cache_path.read_bytes()
+        for damaged in (full[:len(full) // 2], b""):
+            cache_path.write_bytes(damaged)
+            mapa = load_map(DEFAULT_MAP, cache_dir=directory)
+            if not (np.array_equal(mapa.cell_kind, reference.cell_kind) and cache_path.read_bytes() == full):
+                return False
+        return [path.name for path in Path(directory).iterdir()] == [cache_path.name]
+
+def check_tiled_engine(cars_number=400, steps=STEPS, tiles=(3, 2)) -> bool:
+    # Los mosaicos deben dar paso a paso lo mismo que el motor vectorizado con una ronda
+    model = CiudadModel(cars_number=cars_number, place_static=False, seed=0)
+    reference = MotorVectorizado.from_model(model, rounds=1)
+    with MotorParticionado.from_model(model, tiles) as tiled:
+        engine = tiled.engine
+        for _ in range(steps):
+            reference.step()
+            tiled.step()
+            if not all(np.array_equal(getattr(reference, name), getattr(engine, name))
+                       for name in ("pos", "state", "wait", "occupancy", "light_state")):
+                return False
+        return reference.arrivals == engine.arrivals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Revisa que CiudadModel sea determinista y contra las trazas doradas")
+    parser.add_argument("--save", action="store_true", help="guarda las huellas actuales como trazas doradas")
+    args = parser.parse_args()
+
+    traces = {config_name(config): config_trace(config) for config in all_configs()}
+    if args.save:
+        GOLDEN_PATH.write_text(json.dumps({"steps": STEPS, "traces": traces}, indent=2) + "\n")
+        print(f"{len(traces)} trazas -> {GOLDEN_PATH.name}")
+        sys.exit(0)
+
+    failures = []
+    checks = [("random global", lambda: check_global_random(CONFIGS[0])),
+              ("procesos", lambda: check_processes(traces)),
+              ("instantánea", lambda: all(check_snapshot(config) for config in CONFIGS[::2])),
+              ("sorteos en lote", check_vectorized_draws),
+              ("salidas del motor", lambda: check_engine_spawn(CONFIGS[0])),
+              ("estacionamiento lleno", check_crowded_parking),
+              ("motor en mosaicos", check_tiled_engine),
+              ("caché del mapa dañada", check_damaged_map_cache)]
+    for name, check in checks:
+        if not check():
+            failures.append(name)
+    golden = json.loads(GOLDEN_PATH.read_text())["traces"]
+    failures += [f"traza {name}" for name, digest in traces.items() if golden.get(name) != digest]
+    for failure in failures:
+        print("FALLA", failure)
+    print(f"{len(checks)} revisiones, {len(traces)} trazas: {'ok' if not failures else f'{len(failures)} fallas'}")
+    sys.exit(1 if failures else 0)
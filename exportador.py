@@ -0,0 +1,196 @@
+import argparse
+import struct
+import numpy as np
+from capas import MOVES, ORIENTATION_BITS
+
+# Flujo binario de cuadros para el cliente de Unity: el mapa estático va una sola vez al inicio
+# y después, por paso, solo los coches y semáforos que cambiaron. Cada keyframe_every pasos va un
+# cuadro completo para que el cliente pueda empezar a mitad de la repetición.
+#
+# Todo es little-endian. El archivo empieza con MAGIC y VERSION (u8); después vienen cuadros con
+# encabezado FRAME_HEADER (tipo u8, paso u32, tamaño u32) seguido del contenido:
+#   FRAME_MAP: width u16, height u16, hash del mapa (32 bytes), cell_kind y cell_orientation
+#       (width*height bytes cada uno, orden [x, y]), número de semáforos u16 y por semáforo:
+#       orientación u8, número de celdas u8 y celdas (x u16, y u16)
+#   FRAME_KEY: número de coches u32, registros CAR_DTYPE, número de semáforos u16, estados u8
+#   FRAME_DELTA: coches nuevos o que cambiaron u32 + registros CAR_DTYPE, coches que salieron
+#       u32 + ids u32, semáforos que cambiaron u16 + registros LIGHT_DTYPE
+
+MAGIC = b"CDF"
+VERSION = 1
+FRAME_MAP = 0
+FRAME_KEY = 1
+FRAME_DELTA = 2
+FRAME_HEADER = struct.Struct("<BII")
+
+# direction: bit de ORIENTATION_BITS del último movimiento (0 si el coche no se ha movido)
+CAR_DTYPE = np.dtype([("id", "<u4"), ("x", "<u2"), ("y", "<u2"), ("direction", "u1")])
+LIGHT_DTYPE = np.dtype([("index", "<u2"), ("state", "u1")])
+ORIENTATION_NAMES = list(ORIENTATION_BITS)
+DIRECTION_CODES = {delta: ORIENTATION_BITS[name] for name, delta in MOVES}
+
+class ExportadorFrames:
+    def __init__(self, model, stream, keyframe_every=100):
+        if keyframe_every <= 0:
+            raise ValueError("keyframe_every must be positive")
+        self.model = model
+        self.stream = stream
+        self.keyframe_every = keyframe_every
+        self.frames = 0
+        self.cars = np.zeros(0, dtype=CAR_DTYPE)  # último estado enviado, ordenado por id
+        self.lights = np.zeros(0, dtype=np.uint8)
+        self.stream.write(MAGIC + bytes([VERSION]))
+        self.write_map()
+        self.write_frame()  # estado inicial
+
+    def write_frame_bytes(self, kind, payload):
+        self.stream.write(FRAME_HEADER.pack(kind, self.model.count_steps, len(payload)))
+        self.stream.write(payload)
+
+    def write_map(self):
+        mapa = self.model.mapa
+        parts = [struct.pack("<HH", mapa.width, mapa.height), bytes.fromhex(mapa.map_hash or "0" * 64),
+                 mapa.cell_kind.astype(np.uint8).tobytes(), mapa.cell_orientation.astype(np.uint8).tobytes(),
+                 struct.pack("<H", len(mapa.lights))]
+        for positions, orientation in mapa.lights:
+            parts.append(struct.pack("<BB", ORIENTATION_NAMES.index(orientation), len(positions)))
+            parts.append(np.array(positions, dtype="<u2").tobytes())
+        self.write_frame_bytes(FRAME_MAP, b"".join(parts))
+
+    def current_cars(self) -> np.ndarray:
+        from ciudad import Coche
+        cars = [agent for agent in self.model.schedule.agents if isinstance(agent, Coche)]
+        records = np.zeros(len(cars), dtype=CAR_DTYPE)
+        records["id"] = [car.unique_id for car in cars]
+        records["x"] = [car.pos[0] for car in cars]
+        records["y"] = [car.pos[1] for car in cars]
+        records.sort(order="id")
+
+        # La dirección sale de la posición anterior: se conserva si el coche no se movió
+        previous = self.cars
+        index = np.searchsorted(previous["id"], records["id"])
+        known = index < len(previous)
+        known[known] = previous["id"][index[known]] == records["id"][known]
+        before = previous[index[known]]
+        dx = records["x"][known].astype(np.int32) - before["x"]
+        dy = records["y"][known].astype(np.int32) - before["y"]
+        direction = before["direction"].copy()
+        for (mx, my), code in DIRECTION_CODES.items():
+            direction[(dx == mx) & (dy == my)] = code
+        records["direction"][known] = direction
+        return records
+
+    def write_frame(self):
+        # Llamar después de cada model.step()
+        cars = self.current_cars()
+        lights = np.array([semaforo.state == "green" for semaforo in self.model.lista_semaforos], dtype=np.uint8)
+        if self.frames % self.keyframe_every == 0:
+            payload = [struct.pack("<I", len(cars)), cars.tobytes(), struct.pack("<H", len(lights)), lights.tobytes()]
+            self.write_frame_bytes(FRAME_KEY, b"".join(payload))
+        else:
+            previous = self.cars
+            index = np.searchsorted(previous["id"], cars["id"])
+            same = index < len(previous)
+            same[same] = previous[index[same]] == cars[same]
+            changed = cars[~same]
+            removed = np.setdiff1d(previous["id"], cars["id"], assume_unique=True).astype("<u4")
+            light_changes = np.flatnonzero(lights != self.lights)
+            light_records = np.zeros(len(light_changes), dtype=LIGHT_DTYPE)
+            light_records["index"] = light_changes
+            light_records["state"] = lights[light_changes]
+            payload = [struct.pack("<I", len(changed)), changed.tobytes(),
+                       struct.pack("<I", len(removed)), removed.tobytes(),
+                       struct.pack("<H", len(light_records)), light_records.tobytes()]
+            self.write_frame_bytes(FRAME_DELTA, b"".join(payload))
+        self.cars = cars
+        self.lights = lights
+        self.frames += 1
+
+    def close(self):
+        self.stream.close()
+
+def read_frames(stream):
+    # Decodifica el flujo: genera (tipo, paso, dict con el contenido del cuadro)
+    header = stream.read(len(MAGIC) + 1)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a frame stream")
+    if header[len(MAGIC)] != VERSION:
+        raise ValueError(f"Frame stream version {header[len(MAGIC)]} is not {VERSION}")
+    while True:
+        raw = stream.read(FRAME_HEADER.size)
+        if len(raw) < FRAME_HEADER.size:
+            return
+        kind, step, size = FRAME_HEADER.unpack(raw)
+        yield kind, step, _decode(kind, memoryview(stream.read(size)))
+
+def _decode(kind, data) -> dict:
+    offset = 0
+
+    def take(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    def count(fmt):
+        nonlocal offset
+        (value,) = struct.unpack_from(fmt, data, offset)
+        offset += struct.calcsize(fmt)
+        return value
+
+    if kind == FRAME_MAP:
+        width, height = count("<H"), count("<H")
+        map_hash = bytes(take(np.uint8, 32)).hex()
+        cell_kind = take(np.uint8, width * height).reshape(width, height)
+        cell_orientation = take(np.uint8, width * height).reshape(width, height)
+        lights = []
+        for _ in range(count("<H")):
+            orientation, cells = count("<B"), count("<B")
+            positions = [tuple(int(v) for v in cell) for cell in take("<u2", cells * 2).reshape(-1, 2)]
+            lights.append((positions, ORIENTATION_NAMES[orientation]))
+        return {"width": width, "height": height, "map_hash": map_hash, "cell_kind": cell_kind,
+                "cell_orientation": cell_orientation, "lights": lights}
+    if kind == FRAME_KEY:
+        cars = take(CAR_DTYPE, count("<I"))
+        return {"cars": cars, "lights": take(np.uint8, count("<H"))}
+    if kind == FRAME_DELTA:
+        changed = take(CAR_DTYPE, count("<I"))
+        removed = take("<u4", count("<I"))
+        return {"changed": changed, "removed": removed, "lights": take(LIGHT_DTYPE, count("<H"))}
+    raise ValueError(f"Unknown frame type {kind}")
+
+def replay(stream):
+    # Reconstruye el estado completo en cada paso: genera (paso, {id: registro}, estados de semáforos)
+    cars, lights = None, None
+    for kind, step, frame in read_frames(stream):
+        if kind == FRAME_KEY:
+            cars = {int(record["id"]): record for record in frame["cars"]}
+            lights = frame["lights"].copy()
+        elif kind == FRAME_DELTA:
+            if cars is None:
+                continue  # el cliente empezó a mitad del flujo: espera el siguiente keyframe
+            for record in frame["removed"]:
+                del cars[int(record)]
+            cars.update({int(record["id"]): record for record in frame["changed"]})
+            lights[frame["lights"]["index"]] = frame["lights"]["state"]
+        else:
+            continue
+        yield step, dict(cars), lights.copy()
+
+if __name__ == "__main__":
+    from ciudad import CiudadModel
+    parser = argparse.ArgumentParser(description="Exporta una corrida de CiudadModel como flujo de cuadros")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--cars", type=int, default=25)
+    parser.add_argument("--map", default=None)
+    parser.add_argument("--routing", default="heuristic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keyframe-every", type=int, default=100)
+    args = parser.parse_args()
+
+    with CiudadModel(cars_number=args.cars, map_path=args.map, routing=args.routing, place_static=False,
+                     seed=args.seed, export_path=args.output, keyframe_every=args.keyframe_every) as model:
+        while model.count_steps < args.steps and model.active_cars:
+            model.step()
+    print(f"{args.output}: {model.count_steps} pasos")
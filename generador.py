@@ -0,0 +1,193 @@
+import argparse
+import json
+from collections import deque
+import numpy as np
+from capas import KIND_PARKING, ORIENTATION_BITS
+from mapa import compile_map
+from rutas import street_moves, predecessor_lists
+
+# Generador de ciudades para pruebas de escala. Produce un mapa en el mismo formato que
+# mapas/centro.json: cuadrícula de calles de un sentido (2 carriles) con anillo exterior,
+# avenidas de doble sentido (4 carriles), glorietas donde se cruzan dos avenidas,
+# manzanas de edificios con entradas de estacionamiento y pares de semáforos.
+
+SYMBOLS = {"Right": ">", "Left": "<", "Up": "^", "Down": "v"}
+# Cruces de una dirección vertical con una horizontal (mismas letras que centro.json)
+LEGEND = {"a": ["Right", "Up"], "b": ["Left", "Up"], "c": ["Right", "Down"], "d": ["Left", "Down"]}
+
+def street_lines(size, block, avenue_every):
+    # Líneas de calle a lo largo de un eje: (inicio, [dirección por carril]).
+    # La primera y la última son el anillo exterior; las interiores alternan sentido
+    lines = [(0, ["low", "low"])]
+    cursor, index = 2, 1
+    while True:
+        lanes = 4 if avenue_every and index % avenue_every == 0 else 2
+        start = cursor + block
+        if start + lanes + 2 + 2 > size:
+            break
+        if lanes == 4:
+            lines.append((start, ["low", "low", "high", "high"]))
+        else:
+            direction = "high" if index % 2 else "low"
+            lines.append((start, [direction, direction]))
+        cursor = start + lanes
+        index += 1
+    lines.append((size - 2, ["high", "high"]))
+    return lines
+
+def generar_ciudad(width, height, block=8, avenue_every=3, light_fraction=0.5, parkings_per_block=2,
+                   roundabouts=True, seed=None, name=None) -> dict:
+    if width < 8 or height < 8:
+        raise ValueError("The generated city needs at least 8x8 cells")
+    rng = np.random.default_rng(seed)
+
+    # "low"/"high" es el sentido sobre el eje: las columnas bajan por la izquierda y suben por la
+    # derecha, las filas van a la derecha abajo y a la izquierda arriba (como el anillo de centro.json)
+    vertical = {"low": "Down", "high": "Up"}
+    horizontal = {"low": "Right", "high": "Left"}
+    columns = street_lines(width, block, avenue_every)
+    rows = street_lines(height, block, avenue_every)
+
+    column_dir = [None] * width
+    row_dir = [None] * height
+    for start, lanes in columns:
+        for offset, direction in enumerate(lanes):
+            column_dir[start + offset] = vertical[direction]
+    for start, lanes in rows:
+        for offset, direction in enumerate(lanes):
+            row_dir[start + offset] = horizontal[direction]
+
+    orientation = np.zeros((width, height), dtype=np.uint8)
+    for x, direction in enumerate(column_dir):
+        if direction:
+            orientation[x, :] |= ORIENTATION_BITS[direction]
+    for y, direction in enumerate(row_dir):
+        if direction:
+            orientation[:, y] |= ORIENTATION_BITS[direction]
+
+    # Glorietas: el centro 2x2 del cruce de dos avenidas se vuelve edificio
+    if roundabouts:
+        for x0, x_lanes in columns:
+            for y0, y_lanes in rows:
+                if len(x_lanes) == 4 and len(y_lanes) == 4:
+                    orientation[x0 + 1:x0 + 3, y0 + 1:y0 + 3] = 0
+
+    symbol = {ORIENTATION_BITS[name]: char for name, char in SYMBOLS.items()}
+    for char, names in LEGEND.items():
+        symbol[sum(ORIENTATION_BITS[name] for name in names)] = char
+    cells = np.full((width, height), "#", dtype="<U1")
+    for mask, char in symbol.items():
+        cells[orientation == mask] = char
+
+    # Semáforos en cruces de dos calles de un sentido: uno en la llegada vertical y otro en la
+    # horizontal, cada uno contando coches hacia atrás de su llegada
+    lights, light_pairs = [], []
+    for x0, x_lanes in columns:
+        for y0, y_lanes in rows:
+            if len(x_lanes) != 2 or len(y_lanes) != 2 or rng.random() >= light_fraction:
+                continue
+            down = column_dir[x0] == "Down"
+            approach_y = y0 + 2 if down else y0 - 1
+            right = row_dir[y0] == "Right"
+            approach_x = x0 - 1 if right else x0 + 2
+            if not (0 <= approach_y < height and 0 <= approach_x < width):
+                continue
+            vertical_cells = [[x0, approach_y], [x0 + 1, approach_y]]
+            horizontal_cells = [[approach_x, y0], [approach_x, y0 + 1]]
+            if any(cells[x, y] not in SYMBOLS.values() for x, y in vertical_cells + horizontal_cells):
+                continue
+            light_pairs.append([len(lights), len(lights) + 1])
+            lights.append({"cells": vertical_cells, "orientation": "Down" if down else "Up"})
+            lights.append({"cells": horizontal_cells, "orientation": "Left" if right else "Right"})
+    light_cells = {tuple(cell) for light in lights for cell in light["cells"]}
+
+    # Estacionamientos: celdas del borde de cada manzana con salida hacia la calle vecina
+    parkings = []
+    x_edges = [start + len(lanes) for start, lanes in columns[:-1]], [start for start, _ in columns[1:]]
+    y_edges = [start + len(lanes) for start, lanes in rows[:-1]], [start for start, _ in rows[1:]]
+    for bx0, bx1 in zip(*x_edges):
+        for by0, by1 in zip(*y_edges):
+            candidates = []
+            for y in range(by0 + 1, by1 - 1):
+                candidates += [((bx0, y), "Left", (bx0 - 1, y)), ((bx1 - 1, y), "Right", (bx1, y))]
+            for x in range(bx0 + 1, bx1 - 1):
+                candidates += [((x, by0), "Down", (x, by0 - 1)), ((x, by1 - 1), "Up", (x, by1))]
+            candidates = [candidate for candidate in candidates if candidate[2] not in light_cells]
+            if not candidates:
+                continue
+            chosen = rng.choice(len(candidates), size=min(parkings_per_block, len(candidates)), replace=False)
+            for index in sorted(chosen):
+                (x, y), exit_direction, _ = candidates[index]
+                if cells[x, y] == "#":
+                    cells[x, y] = SYMBOLS[exit_direction]
+                    parkings.append([int(x), int(y)])
+
+    spec = {
+        "name": name or f"generada-{width}x{height}",
+        "width": width,
+        "height": height,
+        "legend": LEGEND,
+        "rows": ["".join(cells[:, y]) for y in range(height - 1, -1, -1)],
+        "parkings": parkings,
+        "lights": lights,
+        "light_pairs": light_pairs,
+    }
+    return drop_unreachable_parkings(spec)
+
+def drop_unreachable_parkings(spec: dict) -> dict:
+    # Solo se quedan los estacionamientos cuya salida y entrada conectan con la componente
+    # fuertemente conexa principal de calles, así cualquier par de ellos es alcanzable
+    mapa = compile_map(spec)
+    moves = street_moves(mapa.cell_kind, mapa.cell_orientation)
+    predecessors = predecessor_lists(moves)
+    is_parking = (mapa.cell_kind.ravel() & KIND_PARKING) > 0
+    seed_cell = 0 * mapa.height + (mapa.height - 1)  # esquina del anillo exterior
+
+    forward = _reach(seed_cell, lambda cell: moves[cell].tolist(), is_parking)
+    backward = _reach(seed_cell, lambda cell: predecessors[cell], is_parking)
+    component = forward & backward
+
+    rows = [list(row) for row in spec["rows"]]
+    parkings = []
+    for x, y in spec["parkings"]:
+        cell = x * mapa.height + y
+        exits = any(target >= 0 and component[target] for target in moves[cell].tolist())
+        entries = any(component[source] for source in predecessors[cell])
+        if exits and entries:
+            parkings.append([x, y])
+        else:
+            rows[mapa.height - 1 - y][x] = "#"
+    return dict(spec, rows=["".join(row) for row in rows], parkings=parkings)
+
+def _reach(start, neighbours, is_parking) -> np.ndarray:
+    seen = np.zeros(len(is_parking), dtype=bool)
+    seen[start] = True
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        for target in neighbours(cell):
+            if target >= 0 and not seen[target] and not is_parking[target]:
+                seen[target] = True
+                queue.append(target)
+    return seen
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una ciudad en el formato de mapas/centro.json")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--block", type=int, default=8)
+    parser.add_argument("--avenue-every", type=int, default=3)
+    parser.add_argument("--light-fraction", type=float, default=0.5)
+    parser.add_argument("--parkings-per-block", type=int, default=2)
+    parser.add_argument("--no-roundabouts", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    spec = generar_ciudad(args.width, args.height, block=args.block, avenue_every=args.avenue_every,
+                          light_fraction=args.light_fraction, parkings_per_block=args.parkings_per_block,
+                          roundabouts=not args.no_roundabouts, seed=args.seed)
+    with open(args.output, "w") as file:
+        json.dump(spec, file)
+    print(f"{args.output}: {args.width}x{args.height}, {len(spec['parkings'])} estacionamientos, "
+          f"{len(spec['lights'])} semáforos")
@@ -0,0 +1,103 @@
+import json
+import numpy as np
+from exportador import ExportadorFrames
+from mapa import load_map
+from senales import ControladorPorFases
+
+# Instantáneas de un CiudadModel a mitad de corrida: coches (en el orden del scheduler, que es el
+# orden en que se mueven), semáforos, estado del controlador, semilla y contadores. Los sorteos
+# dependen solo de (seed, agente, paso), así que con la semilla basta para seguir igual.
+# El mapa no se guarda: la instantánea lleva su hash y al restaurar se verifica contra el mapa dado.
+# Los planes D* Lite no se guardan; cada coche vuelve a planear en su siguiente paso.
+# La demanda (DemandaOD) tampoco se guarda, solo si había una: al restaurar hay que volver a pasarla.
+
+SNAPSHOT_VERSION = 3
+
+CAR_DTYPE = np.dtype([("id", "<i4"), ("serial", "<i4"), ("x", "<i2"), ("y", "<i2"),
+                      ("origin_x", "<i2"), ("origin_y", "<i2"), ("destination_x", "<i2"), ("destination_y", "<i2"),
+                      ("departure_step", "<i4")])
+
+def save_snapshot(model, path):
+    from ciudad import Coche
+    cars = [agent for agent in model.schedule.agents if isinstance(agent, Coche)]
+    records = np.zeros(len(cars), dtype=CAR_DTYPE)
+    for record, car in zip(records, cars):
+        record["id"] = car.unique_id
+        record["serial"] = car.serial
+        record["x"], record["y"] = car.pos
+        record["origin_x"], record["origin_y"] = car.first_parking
+        record["destination_x"], record["destination_y"] = car.destination_parking
+        record["departure_step"] = car.departure_step
+
+    signals = model.signals
+    phased = isinstance(signals, ControladorPorFases)
+    config = {"routing": model.routing, "light_policy": model.light_policy, "light_options": model.light_options,
+              "cars_number": model.cars_number, "map_name": model.mapa.name,
+              "demand": model.demand is not None, "skip_blocked": model.skip_blocked}
+    with open(path, "wb") as file:
+        np.savez_compressed(
+            file, version=SNAPSHOT_VERSION, map_hash=model.mapa.map_hash or "", config=json.dumps(config),
+            counters=np.array([model.rng_seed, model.count_steps, model.id, model.cars_created,
+                               model.schedule.steps, model.schedule.time], dtype=np.int64),
+            cars=records, trip_times=np.array(model.trip_times, dtype=np.int32),
+            light_green=np.array([semaforo.state == "green" for semaforo in model.lista_semaforos], dtype=bool),
+            light_timer=np.array([semaforo.timer for semaforo in model.lista_semaforos], dtype=np.int32),
+            light_threshold=np.array([semaforo.change_threshold for semaforo in model.lista_semaforos], dtype=np.int32),
+            light_crossings=model.light_crossings,
+            signals_start=np.array([signals.start_step], dtype=np.int64), signals_crossings=signals.start_crossings,
+            signals_phase=np.array(signals.phase if phased else [], dtype=np.int8),
+            signals_heap=np.array(signals.heap if phased else [], dtype=np.int64).reshape(-1, 2))
+
+def load_snapshot(path, map_path=None, place_static=False, seed=None, export_path=None, keyframe_every=100,
+                  **options):
+    # map_path debe ser el mismo mapa (por defecto mapas/centro.json); options pasa a CiudadModel
+    # (por ejemplo trace_level). Con otra seed la corrida sigue desde el mismo estado pero con
+    # sorteos distintos, útil para bifurcar escenarios desde una misma instantánea. Si la corrida
+    # tenía demanda, options debe traer la misma demand=
+    from ciudad import CiudadModel, Coche
+    with np.load(path) as data:
+        if int(data["version"]) != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {int(data['version'])} is not {SNAPSHOT_VERSION}")
+        state = {name: data[name] for name in data.files}
+    config = json.loads(str(state["config"]))
+    mapa = load_map(map_path)
+    if (mapa.map_hash or "") != str(state["map_hash"]):
+        raise ValueError(f"Snapshot was taken on map {config['map_name']}, not {mapa.name}")
+    if config["demand"] and options.get("demand") is None:
+        raise ValueError("Snapshot was taken with an OD demand; pass the same demand= to restore it")
+    options.setdefault("skip_blocked", config["skip_blocked"])
+
+    rng_seed, count_steps, next_id, cars_created, schedule_steps, schedule_time = (int(value) for value in state["counters"])
+    model = CiudadModel(cars_number=0, routing=config["routing"], map_path=map_path, place_static=place_static,
+                        light_policy=config["light_policy"], light_options=config["light_options"],
+                        seed=rng_seed if seed is None else seed, **options)
+    model.cars_number = config["cars_number"]
+    model.count_steps, model.id = count_steps, next_id
+    model.schedule.steps, model.schedule.time = schedule_steps, schedule_time
+    model.tracer.step = model.count_steps
+    model.trip_times = [int(value) for value in state["trip_times"]]
+
+    for record in state["cars"]:
+        car = Coche(int(record["id"]), model, (int(record["origin_x"]), int(record["origin_y"])),
+                    (int(record["destination_x"]), int(record["destination_y"])))
+        car.departure_step = int(record["departure_step"])
+        car.serial = int(record["serial"])
+        model.place_car(car, (int(record["x"]), int(record["y"])))
+
+    for semaforo, green, timer, threshold in zip(model.lista_semaforos, state["light_green"], state["light_timer"],
+                                                 state["light_threshold"]):
+        semaforo.state = "green" if green else "red"
+        semaforo.timer = int(timer)
+        semaforo.change_threshold = int(threshold)
+    model.light_crossings[:] = state["light_crossings"]
+    signals = model.signals
+    signals.start_step = int(state["signals_start"][0])
+    signals.start_crossings = state["signals_crossings"].copy()
+    if isinstance(signals, ControladorPorFases):
+        signals.phase = [int(phase) for phase in state["signals_phase"]]
+        signals.heap = [(int(due), int(pair)) for due, pair in state["signals_heap"]]
+
+    model.cars_created = cars_created
+    if export_path:
+        model.exporter = ExportadorFrames(model, open(export_path, "wb"), keyframe_every)
+    return model
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+import numpy as np
+from capas import KIND_STREET, KIND_BUILDING, KIND_PARKING, KIND_LIGHT, ORIENTATION_BITS, orientation_mask
+
+# Formato del mapa (JSON):
+#   "rows": filas de la ciudad, la primera es y = height - 1
+#       '>' '<' '^' 'v' calle de un sentido, '#' edificio, '.' vacío,
+#       y las letras de "legend" para calles con varias orientaciones (glorietas)
+#   "parkings": [x, y] en orden de idParking; son entradas de edificio, así que la celda
+#       debe ser calle (con la orientación de salida)
+#   "lights": {"cells": [[x, y], ...], "orientation": dirección en la que cuenta coches}
+#   "light_pairs": pares de índices de "lights" que compiten por una intersección
+
+DEFAULT_MAP = Path(__file__).resolve().parent / "mapas" / "centro.json"
+CACHE_VERSION = 1
+
+SYMBOLS = {">": ["Right"], "<": ["Left"], "^": ["Up"], "v": ["Down"]}
+ORIENTATION_NAMES = list(ORIENTATION_BITS)
+
+class MapaCiudad:
+    def __init__(self, name, cell_kind, cell_orientation, parking_id, light_index, lights, light_pairs, map_hash):
+        self.name = name
+        self.width, self.height = cell_kind.shape
+        self.cell_kind = cell_kind
+        self.cell_orientation = cell_orientation
+        self.parking_id = parking_id
+        self.light_index = light_index
+        self.lights = lights
+        self.light_pairs = light_pairs
+        self.map_hash = map_hash
+
+def compile_map(spec: dict, map_hash: str = None) -> MapaCiudad:
+    width, height = spec["width"], spec["height"]
+    rows = spec["rows"]
+    if len(rows) != height or any(len(row) != width for row in rows):
+        raise ValueError(f"Map rows do not match {width}x{height}")
+
+    # Tablas de búsqueda por carácter: tipo de celda y máscara de orientaciones
+    kind_lut = np.full(256, 255, dtype=np.uint8)
+    orientation_lut = np.zeros(256, dtype=np.uint8)
+    kind_lut[ord(".")] = 0
+    kind_lut[ord("#")] = KIND_BUILDING
+    for symbol, orientations in list(SYMBOLS.items()) + list(spec.get("legend", {}).items()):
+        kind_lut[ord(symbol)] = KIND_STREET
+        orientation_lut[ord(symbol)] = orientation_mask(orientations)
+
+    chars = np.frombuffer("".join(rows).encode("ascii"), dtype=np.uint8).reshape(height, width)
+    chars = chars[::-1].T  # a [x, y] con y hacia arriba
+    cell_kind = kind_lut[chars]
+    if (cell_kind == 255).any():
+        x, y = np.argwhere(cell_kind == 255)[0]
+        raise ValueError(f"Unknown map symbol {chr(chars[x, y])!r} at {(x, y)}")
+    cell_orientation = orientation_lut[chars]
+
+    parking_id = np.zeros((width, height), dtype=np.int16)
+    for index, (x, y) in enumerate(spec.get("parkings", [])):
+        if not cell_kind[x, y] & KIND_STREET:
+            raise ValueError(f"Parking at {(x, y)} is not on a street cell")
+        cell_kind[x, y] |= KIND_PARKING | KIND_BUILDING
+        parking_id[x, y] = index + 1
+
+    light_index = np.full((width, height), -1, dtype=np.int16)
+    lights = []
+    for index, light in enumerate(spec.get("lights", [])):
+        positions = [tuple(cell) for cell in light["cells"]]
+        for x, y in positions:
+            if not cell_kind[x, y] & KIND_STREET:
+                raise ValueError(f"Traffic light at {(x, y)} is not on a street cell")
+            cell_kind[x, y] |= KIND_LIGHT
+            light_index[x, y] = index
+        lights.append((positions, light["orientation"]))
+
+    light_pairs = [tuple(pair) for pair in spec.get("light_pairs", [])]
+    return MapaCiudad(spec.get("name", "mapa"), cell_kind, cell_orientation, parking_id, light_index,
+                      lights, light_pairs, map_hash)
+
+def save_compiled(mapa: MapaCiudad, path):
+    light_cells = [cell for positions, _ in mapa.lights for cell in positions]
+    light_offsets = np.cumsum([0] + [len(positions) for positions, _ in mapa.lights])
+    np.savez(path, version=CACHE_VERSION, name=mapa.name, map_hash=mapa.map_hash,
+             cell_kind=mapa.cell_kind, cell_orientation=mapa.cell_orientation,
+             parking_id=mapa.parking_id, light_index=mapa.light_index,
+             light_cells=np.array(light_cells, dtype=np.int32).reshape(-1, 2),
+             light_offsets=light_offsets.astype(np.int32),
+             light_orientation=np.array([ORIENTATION_NAMES.index(orientation) for _, orientation in mapa.lights], dtype=np.int8),
+             light_pairs=np.array(mapa.light_pairs, dtype=np.int32).reshape(-1, 2))
+
+def load_compiled(path: Path) -> MapaCiudad:
+    with np.load(path) as data:
+        if int(data["version"]) != CACHE_VERSION:
+            raise ValueError(f"Compiled map version {int(data['version'])} is not {CACHE_VERSION}")
+        light_cells = [(int(x), int(y)) for x, y in data["light_cells"]]
+        offsets = data["light_offsets"]
+        lights = [(light_cells[offsets[i]:offsets[i + 1]], ORIENTATION_NAMES[orientation])
+                  for i, orientation in enumerate(data["light_orientation"])]
+        return MapaCiudad(str(data["name"]), data["cell_kind"], data["cell_orientation"], data["parking_id"],
+                          data["light_index"], lights, [tuple(int(i) for i in pair) for pair in data["light_pairs"]],
+                          str(data["map_hash"]))
+
+def spec_hash(spec: dict) -> str:
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+def source_hash(source=None) -> str:
+    # El mismo hash que load_map pone en map_hash, sin compilar el mapa
+    if isinstance(source, dict):
+        return spec_hash(source)
+    path = Path(source) if source is not None else DEFAULT_MAP
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def load_map(source=None, cache_dir=None) -> MapaCiudad:
+    # source: ruta a un mapa JSON (por defecto mapas/centro.json) o el dict ya cargado.
+    # El mapa compilado se guarda como .npz con el hash del archivo en el nombre, así que un
+    # proceso nuevo solo lee arreglos en lugar de volver a compilar
+    if isinstance(source, dict):
+        map_hash = spec_hash(source)
+        if cache_dir is None:
+            return compile_map(source, map_hash)
+        name = source.get("name", "mapa")
+        return _cached(Path(cache_dir) / f"{name}-{map_hash[:16]}.npz", lambda: source, map_hash)
+
+    path = Path(source) if source is not None else DEFAULT_MAP
+    raw = path.read_bytes()
+    map_hash = hashlib.sha256(raw).hexdigest()
+    cache_dir = Path(cache_dir) if cache_dir is not None else path.parent / ".cache"
+    return _cached(cache_dir / f"{path.stem}-{map_hash[:16]}.npz", lambda: json.loads(raw), map_hash)
+
+def _cached(cache_path: Path, read_spec, map_hash: str) -> MapaCiudad:
+    if cache_path.exists():
+        try:
+            return load_compiled(cache_path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            pass  # caché vieja o dañada: se vuelve a compilar
+    mapa = compile_map(read_spec(), map_hash)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Se escribe a un temporal del mismo directorio y se renombra: otro proceso que lea la caché
+        # al mismo tiempo ve el archivo completo o no lo ve
+        fd, temp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.stem, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                save_compiled(mapa, file)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        pass  # sin permiso de escritura: se usa el mapa sin caché
+    return mapa
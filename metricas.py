@@ -0,0 +1,79 @@
+import numpy as np
+
+# Métricas de CiudadModel en columnas: agregados por paso, un registro por viaje terminado y un
+# mapa de calor con la ocupación acumulada de cada celda. Los registros van a arreglos numpy
+# preasignados que duplican su capacidad al llenarse, así que registrar cuesta una asignación.
+
+# waiting: coches que siguen en la simulación y no se movieron en el paso
+STEP_DTYPE = np.dtype([("step", "<i4"), ("active_cars", "<i4"), ("arrivals", "<i4"), ("moves", "<i4"),
+                       ("waiting", "<i4"), ("queued", "<i4"), ("max_queue", "<i4"), ("crossings", "<i4")])
+TRIP_DTYPE = np.dtype([("car", "<i4"), ("origin_x", "<i2"), ("origin_y", "<i2"),
+                       ("destination_x", "<i2"), ("destination_y", "<i2"),
+                       ("departure_step", "<i4"), ("arrival_step", "<i4")])
+
+class BufferColumnas:
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    def append(self, row: tuple):
+        if self.size == len(self.data):
+            self.data = np.resize(self.data, 2 * len(self.data))
+        self.data[self.size] = row
+        self.size += 1
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+class Metricas:
+    def __init__(self, model, capacity=1024):
+        self.model = model
+        self.steps = BufferColumnas(STEP_DTYPE, capacity)
+        self.trips = BufferColumnas(TRIP_DTYPE, capacity)
+        self.heatmap = np.zeros(model.occupancy.shape, dtype=np.int64)
+        self.last_crossings = int(model.light_crossings.sum())
+
+    def trip(self, car, arrival_step: int):
+        self.trips.append((car.serial, *car.first_parking, *car.destination_parking, car.departure_step, arrival_step))
+
+    def end_step(self):
+        # Llamar al final de model.step(), antes de que el trazador reinicie sus contadores del paso
+        model = self.model
+        tracer = model.tracer
+        queues = model.queue_lengths()
+        crossings = int(model.light_crossings.sum())
+        self.steps.append((model.count_steps, model.active_cars, tracer.step_arrivals, tracer.step_moves,
+                           model.active_cars - tracer.step_moves,
+                           int(queues.sum()), int(queues.max()) if len(queues) else 0,
+                           crossings - self.last_crossings))
+        self.last_crossings = crossings
+        self.heatmap += model.occupancy
+
+    def trip_times(self) -> np.ndarray:
+        trips = self.trips.view()
+        return trips["arrival_step"] - trips["departure_step"]
+
+    def congestion(self) -> np.ndarray:
+        # Ocupación media de cada celda por paso registrado
+        return self.heatmap / max(self.steps.size, 1)
+
+    def to_numpy(self) -> dict:
+        return {"steps": self.steps.view().copy(), "trips": self.trips.view().copy(), "heatmap": self.heatmap.copy()}
+
+    def save(self, path):
+        np.savez_compressed(path, map_hash=self.model.mapa.map_hash or "", **self.to_numpy())
+
+    def save_parquet(self, prefix):
+        # prefix-pasos.parquet y prefix-viajes.parquet; pyarrow es opcional y solo se usa aquí
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Saving metrics as Parquet needs pyarrow (pip install pyarrow)") from error
+        for name, records in (("pasos", self.steps.view()), ("viajes", self.trips.view())):
+            table = pa.table({column: records[column] for column in records.dtype.names})
+            pq.write_table(table, f"{prefix}-{name}.parquet")
+
+def load_metrics(path) -> dict:
+    with np.load(path) as data:
+        return {name: data[name] for name in ("steps", "trips", "heatmap")}
@@ -0,0 +1,187 @@
+import numpy as np
+from capas import KIND_PARKING, sensing_windows
+from rutas import GrafoTransiciones, TablaRutas, parking_reachability, spawn_pairs
+from aleatorio import STREAM_LIGHT_TIE, STREAM_SPAWN, new_seed, uniform_array
+
+# Estados de cada coche en el motor vectorizado
+CAR_INACTIVE = 0
+CAR_DRIVING = 1
+CAR_ARRIVED = 2
+
+class MotorVectorizado:
+    # Motor alterno para flotas grandes: todos los coches viven en arreglos (estructura de arreglos)
+    # y se mueven en pasadas por lotes sobre las capas estáticas. Sigue las reglas de CiudadModel:
+    # orientaciones de un sentido, el rojo bloquea, y al llegar al destino el coche sale.
+    # Los coches siguen la tabla de rutas (como routing="table") en orden de índice; en cada ronda
+    # los conflictos por una misma celda los gana el coche de menor índice.
+    def __init__(self, cell_kind, cell_orientation, parking_id, light_index, lights, light_pairs,
+                 rounds=4, seed=None, routes: TablaRutas = None, reachable=None, check=False):
+        self.width, self.height = cell_kind.shape
+        self.routes = routes if routes is not None else TablaRutas(cell_kind, cell_orientation, parking_id)
+        self.moves = self.routes.moves
+        self.is_parking = (cell_kind.ravel() & KIND_PARKING) > 0
+        self.parking_cells = np.array([x * self.height + y for x, y in self.routes.parkings], dtype=np.int32)
+        # Pares con camino (la tabla de rutas solo calcula las distancias de los destinos usados)
+        if reachable is None:
+            reachable = parking_reachability(GrafoTransiciones(cell_kind, cell_orientation), self.parking_cells)
+        self.reachable = reachable
+        self.spawn_origins, self.spawn_offsets, self.spawn_destinations = spawn_pairs(self.reachable)
+        self.rounds = rounds
+        self.check = check
+        self.seed = seed if seed is not None else new_seed()
+        self.steps = 0
+        self.arrivals = 0
+
+        # Semáforos: celda -> índice de semáforo, ventanas de conteo y pares que compiten
+        self.cell_light = light_index.ravel().astype(np.int32)
+        self.light_state = np.zeros(len(lights), dtype=bool)
+        self.window_cells, self.window_owner = sensing_windows(lights, self.width, self.height)
+        self.light_pairs = np.array(light_pairs, dtype=np.int64).reshape(-1, 2)
+
+        # Coches
+        self.occupancy = np.zeros(self.width * self.height, dtype=np.int32)
+        self.pos = np.zeros(0, dtype=np.int32)
+        self.origin = np.zeros(0, dtype=np.int32)
+        self.destination = np.zeros(0, dtype=np.int32)
+        self.state = np.zeros(0, dtype=np.uint8)
+        self.wait = np.zeros(0, dtype=np.int32)
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        # Copia mapa, semáforos y coches actuales de un CiudadModel (referencia de comportamiento)
+        from ciudad import Coche
+        lights = [(semaforo.positions, semaforo.orientation) for semaforo in model.lista_semaforos]
+        kwargs.setdefault("seed", model.rng_seed)
+        kwargs.setdefault("reachable", model.reachable)
+        engine = cls(model.cell_kind, model.cell_orientation, model.parking_id, model.light_index,
+                     lights, model.pares_semaforos, routes=model.routes, **kwargs)
+        engine.light_state[:] = [semaforo.state == "green" for semaforo in model.lista_semaforos]
+        cars = sorted((agent for agent in model.schedule.agents if isinstance(agent, Coche)), key=lambda car: car.unique_id)
+        engine.add_cars([car.pos for car in cars], [car.destination_parking for car in cars])
+        return engine
+
+    def add_cars(self, origins, destinations):
+        # origins: celdas (x, y); destinations: posiciones de estacionamiento (x, y)
+        origins = np.array([x * self.height + y for x, y in origins], dtype=np.int32)
+        destinations = np.array([self.routes.destination_index[pos] for pos in destinations], dtype=np.int32)
+        self.routes.ensure(destinations)
+        self.pos = np.concatenate([self.pos, origins])
+        self.origin = np.concatenate([self.origin, origins])
+        self.destination = np.concatenate([self.destination, destinations])
+        self.state = np.concatenate([self.state, np.full(len(origins), CAR_DRIVING, dtype=np.uint8)])
+        self.wait = np.concatenate([self.wait, np.zeros(len(origins), dtype=np.int32)])
+        np.add.at(self.occupancy, origins, 1)
+
+    def spawn(self, cars_number):
+        # Origen y destino uniformes entre los pares con camino, con los mismos sorteos que
+        # CiudadModel: el coche número n del motor sale y llega igual que el coche n del modelo
+        if cars_number and not len(self.spawn_origins):
+            raise ValueError("No parking on this map can reach another parking")
+        serial = np.arange(len(self.pos), len(self.pos) + cars_number)
+        draw = uniform_array(self.seed, STREAM_SPAWN, serial, self.steps, 0) * len(self.spawn_origins)
+        origin = self.spawn_origins[draw.astype(np.int64)]
+        start, end = self.spawn_offsets[origin], self.spawn_offsets[origin + 1]
+        draw = uniform_array(self.seed, STREAM_SPAWN, serial, self.steps, 1) * (end - start)
+        destination = self.spawn_destinations[start + draw.astype(np.int64)]
+        self.add_cars([self.routes.parkings[index] for index in origin],
+                      [self.routes.parkings[index] for index in destination])
+
+    def active_count(self) -> int:
+        return int(np.count_nonzero(self.state == CAR_DRIVING))
+
+    def positions(self) -> list[tuple[int, int]]:
+        return [divmod(int(cell), self.height) for cell in self.pos[self.state == CAR_DRIVING]]
+
+    def candidate_moves(self, cars: np.ndarray):
+        # Para cada coche: (k x 4) celdas candidatas sobre un camino más corto, -1 si no sirven
+        cells = self.pos[cars]
+        destination = self.destination[cars]
+        targets = self.moves[cells]
+        valid = targets >= 0
+        safe_targets = np.where(valid, targets, 0)
+        dist, rows = self.routes.dist, self.routes.row_of[destination]
+        current = dist[rows, cells]
+        useful = valid & (current > 0)[:, None]
+        useful &= dist[rows[:, None], safe_targets] == (current - 1)[:, None]
+        goal = safe_targets == self.parking_cells[destination][:, None]
+        useful &= ~self.is_parking[safe_targets] | goal
+        return np.where(useful, safe_targets, -1), goal & useful
+
+    def step(self):
+        previous = self.pos.copy() if self.check else None
+        pending = self.state == CAR_DRIVING
+        moved = np.zeros(len(self.pos), dtype=bool)
+
+        green = self.light_state
+        for _ in range(self.rounds):
+            cars = np.flatnonzero(pending)
+            if not len(cars):
+                break
+            targets, goal = self.candidate_moves(cars)
+            safe_targets = np.maximum(targets, 0)
+            light = self.cell_light[safe_targets]
+            free = (self.occupancy[safe_targets] == 0) & ((light < 0) | green[np.maximum(light, 0)])
+            enterable = (targets >= 0) & (goal | free)
+            has_move = enterable.any(axis=1)
+            if not has_move.any():
+                break
+
+            choice = np.argmax(enterable, axis=1)
+            rows = np.flatnonzero(has_move)
+            movers = cars[rows]
+            chosen = targets[rows, choice[rows]]
+            arriving = goal[rows, choice[rows]]
+
+            # Conflictos: una celda de calle la gana el coche de menor índice (los coches van ordenados)
+            street = np.flatnonzero(~arriving)
+            _, first = np.unique(chosen[street], return_index=True)
+            winners = np.concatenate([np.flatnonzero(arriving), street[first]])
+            movers, chosen, arriving = movers[winners], chosen[winners], arriving[winners]
+
+            np.subtract.at(self.occupancy, self.pos[movers], 1)
+            self.pos[movers] = chosen
+            np.add.at(self.occupancy, chosen[~arriving], 1)
+            self.state[movers[arriving]] = CAR_ARRIVED
+            self.arrivals += int(np.count_nonzero(arriving))
+            moved[movers] = True
+            pending[movers] = False
+
+        driving = self.state == CAR_DRIVING
+        self.wait[driving & ~moved] += 1
+        self.wait[moved] = 0
+        if self.check:
+            self.validate_step(previous, moved)
+        self.steps += 1
+        self.update_lights()
+
+    def queue_lengths(self) -> np.ndarray:
+        return np.bincount(self.window_owner, weights=self.occupancy[self.window_cells], minlength=len(self.light_state))
+
+    def update_lights(self):
+        # Misma regla que CiudadModel.comparar_semaforos, para todos los pares a la vez
+        if not len(self.light_pairs):
+            return
+        counts = self.queue_lengths()
+        first, second = self.light_pairs[:, 0], self.light_pairs[:, 1]
+        coches1, coches2 = counts[first], counts[second]
+        # Mismo sorteo que CiudadModel para desempatar: llave (seed, primer semáforo, paso)
+        coin = uniform_array(self.seed, STREAM_LIGHT_TIE, first, self.steps) < 0.5
+        first_green = (coches1 > coches2) | ((coches1 == coches2) & (coches1 > 0) & coin)
+        second_green = (coches1 < coches2) | ((coches1 == coches2) & (coches1 > 0) & ~coin)
+        self.light_state[first] = first_green
+        self.light_state[second] = second_green
+
+    def validate_step(self, previous, moved):
+        # Revisa el paso contra las reglas de referencia: solo movimientos legales del grafo,
+        # nunca hacia una celda en rojo y nunca dos coches en la misma celda de calle
+        cars = np.flatnonzero(moved)
+        legal = (self.moves[previous[cars]] == self.pos[cars][:, None]).any(axis=1)
+        arrived = self.state[cars] == CAR_ARRIVED
+        light = self.cell_light[self.pos[cars]]
+        red = (light >= 0) & ~self.light_state[np.maximum(light, 0)]
+        driving = self.state == CAR_DRIVING
+        street_cells = self.pos[driving & ~self.is_parking[self.pos]]
+        if not legal.all() or (red & ~arrived).any() or len(np.unique(street_cells)) != len(street_cells):
+            raise RuntimeError(f"Paso {self.steps} no respeta las reglas de CiudadModel")
+        if not np.array_equal(np.bincount(self.pos[driving], minlength=len(self.occupancy)), self.occupancy):
+            raise RuntimeError(f"Paso {self.steps}: la ocupación no coincide con las posiciones")
@@ -0,0 +1,170 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from motor import CAR_ARRIVED, CAR_DRIVING, MotorVectorizado
+
+# Descomposición en mosaicos del motor vectorizado: la cuadrícula se parte en mosaicos rectangulares
+# y cada uno lo mueve su propio proceso. Las posiciones, destinos y estados de los coches, la
+# ocupación y los semáforos viven en memoria compartida; cada mosaico escribe solo sus celdas y
+# sus coches. El resultado es idéntico a MotorVectorizado(rounds=1), porque con una ronda cada coche
+# decide con la ocupación del inicio del paso. Cada paso tiene tres fases separadas por barreras:
+#   1. cada mosaico elige el movimiento de sus coches; la orilla de una celda de los mosaicos
+#      vecinos (celdas fantasma) se lee de la ocupación compartida, que nadie escribe en esta fase
+#   2. cada mosaico resuelve los conflictos por sus celdas (gana el coche de menor índice). Solo
+#      revisa sus propios coches y los que los mosaicos vecinos anotaron en la fase 1 como salientes
+#      (coches de su orilla que quieren cruzar), no la flota completa
+#   3. cada mosaico aplica los movimientos: quita de la ocupación a sus coches que salieron y
+#      suma a los que entraron a sus celdas; los coches que cruzan la orilla pasan al mosaico vecino
+# Al final del paso el proceso principal actualiza los semáforos con la regla de siempre.
+
+SHARED_ARRAYS = ("pos", "destination", "state", "wait", "occupancy", "light_state")
+
+class MotorParticionado:
+    def __init__(self, engine: MotorVectorizado, tiles=(2, 2)):
+        if engine.rounds != 1:
+            raise ValueError("Tiled stepping reproduces MotorVectorizado(rounds=1) only")
+        columns, rows = tiles
+        if not (0 < columns <= engine.width and 0 < rows <= engine.height):
+            raise ValueError(f"Cannot split {engine.width}x{engine.height} into {columns}x{rows} tiles")
+        self.engine = engine
+        self.tiles = columns * rows
+
+        # Mosaico dueño de cada celda (índice plano x * height + y)
+        x_tile = np.repeat(np.arange(columns), [len(part) for part in np.array_split(range(engine.width), columns)])
+        y_tile = np.repeat(np.arange(rows), [len(part) for part in np.array_split(range(engine.height), rows)])
+        self.tile_of = (x_tile[:, None] * rows + y_tile[None, :]).ravel().astype(np.int32)
+        # Un coche avanza una celda, así que solo puede cruzar a un mosaico vecino por un lado
+        self.neighbours = [[(column + dc) * rows + row + dr for dc, dr in ((-1, 0), (1, 0), (0, -1), (0, 1))
+                            if 0 <= column + dc < columns and 0 <= row + dr < rows]
+                           for column in range(columns) for row in range(rows)]
+
+        # Los arreglos del motor pasan a memoria compartida; el motor sigue usándolos por nombre
+        self.blocks = []
+        for name in SHARED_ARRAYS:
+            setattr(engine, name, self.share(getattr(engine, name)))
+        self.target = self.share(np.full(len(engine.pos), -1, dtype=np.int32))
+        self.goal = self.share(np.zeros(len(engine.pos), dtype=bool))
+        self.won = self.share(np.zeros(len(engine.pos), dtype=bool))
+        self.stop = self.share(np.zeros(1, dtype=bool))
+        # Coches de cada mosaico cuyo destino del paso está en otro mosaico (los escribe su dueño)
+        self.outgoing = self.share(np.zeros((self.tiles, len(engine.pos)), dtype=np.int32))
+        self.outgoing_count = self.share(np.zeros(self.tiles, dtype=np.int64))
+
+        context = mp.get_context("fork")  # los procesos heredan las tablas de rutas sin copiarlas
+        self.barrier = context.Barrier(self.tiles + 1)
+        self.workers = [context.Process(target=self.run_tile, args=(tile,), daemon=True)
+                        for tile in range(self.tiles)]
+        for worker in self.workers:
+            worker.start()
+
+    @classmethod
+    def from_model(cls, model, tiles=(2, 2), **kwargs):
+        return cls(MotorVectorizado.from_model(model, rounds=1, **kwargs), tiles)
+
+    def share(self, array: np.ndarray) -> np.ndarray:
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.blocks.append(block)
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[...] = array
+        return shared
+
+    def step(self):
+        engine = self.engine
+        previous = engine.pos.copy() if engine.check else None
+        arrived = int(np.count_nonzero(engine.state == CAR_ARRIVED))
+        for _ in range(4):  # inicio, fin de la fase 1, fin de la fase 2, fin de la fase 3
+            self.barrier.wait()
+        engine.arrivals += int(np.count_nonzero(engine.state == CAR_ARRIVED)) - arrived
+        if engine.check:
+            engine.validate_step(previous, engine.pos != previous)
+        engine.steps += 1
+        engine.update_lights()
+
+    def run_tile(self, tile):
+        try:
+            self.step_tile(tile)
+        except BaseException:
+            self.barrier.abort()  # el proceso principal recibe BrokenBarrierError en lugar de esperar
+            raise
+
+    def step_tile(self, tile):
+        engine = self.engine
+        tile_of = self.tile_of
+        own = np.flatnonzero((engine.state == CAR_DRIVING) & (tile_of[engine.pos] == tile))
+        while True:
+            self.barrier.wait()
+            if self.stop[0]:
+                return
+
+            # Fase 1: movimiento de cada coche propio con la ocupación y semáforos del inicio del paso
+            if len(own):
+                targets, goal = engine.candidate_moves(own)
+                safe_targets = np.maximum(targets, 0)
+                light = engine.cell_light[safe_targets]
+                free = (engine.occupancy[safe_targets] == 0) & ((light < 0) | engine.light_state[np.maximum(light, 0)])
+                enterable = (targets >= 0) & (goal | free)
+                choice = np.argmax(enterable, axis=1)
+                rows = np.arange(len(own))
+                has_move = enterable[rows, choice]
+                self.target[own] = np.where(has_move, targets[rows, choice], -1)
+                self.goal[own] = has_move & goal[rows, choice]
+            claiming = own[self.target[own] >= 0]
+            leaving = claiming[tile_of[self.target[claiming]] != tile]
+            self.outgoing[tile, :len(leaving)] = leaving
+            self.outgoing_count[tile] = len(leaving)
+            self.barrier.wait()
+
+            # Fase 2: conflictos por las celdas del mosaico entre sus coches y los salientes de los
+            # vecinos; ordenados por índice para que gane el menor
+            parts = [claiming[tile_of[self.target[claiming]] == tile]]
+            for neighbour in self.neighbours[tile]:
+                leaving = self.outgoing[neighbour, :self.outgoing_count[neighbour]]
+                parts.append(leaving[tile_of[self.target[leaving]] == tile])
+            claims = np.sort(np.concatenate(parts))
+            arriving = self.goal[claims]
+            street = claims[~arriving]
+            _, first = np.unique(self.target[street], return_index=True)
+            incoming = street[first]
+            incoming_cells = self.target[incoming]  # copia: el dueño del coche reinicia target en la fase 3
+            self.won[claims[arriving]] = True
+            self.won[incoming] = True
+            self.barrier.wait()
+
+            # Fase 3: cada mosaico escribe sus coches y sus celdas
+            moved = own[self.won[own]]
+            np.subtract.at(engine.occupancy, engine.pos[moved], 1)
+            np.add.at(engine.occupancy, incoming_cells, 1)
+            engine.pos[moved] = self.target[moved]
+            engine.state[moved[self.goal[moved]]] = CAR_ARRIVED
+            engine.wait[own] += 1
+            engine.wait[moved] = 0
+            stays = own[~self.won[own]]
+            self.target[own] = -1
+            self.goal[own] = False
+            self.won[own] = False
+            # Entrega: los coches que cruzaron la orilla los toma el mosaico al que entraron
+            own = np.concatenate([stays, incoming])
+            self.barrier.wait()
+
+    def close(self):
+        # Detiene los procesos y regresa los arreglos del motor a memoria normal
+        if not self.workers:
+            return
+        self.stop[0] = True
+        self.barrier.wait()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        for name in SHARED_ARRAYS:
+            setattr(self.engine, name, getattr(self.engine, name).copy())
+        self.target = self.goal = self.won = self.stop = self.outgoing = self.outgoing_count = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
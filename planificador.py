@@ -0,0 +1,118 @@
+import heapq
+from math import inf
+from rutas import GrafoCalles
+
+# Costo extra de pasar por una celda que el coche ve ocupada por otro coche
+BLOCKED_PENALTY = 4
+
+class PlanificadorDStar:
+    # D* Lite (Koenig y Likhachev): busca hacia atrás desde el destino y, cuando cambia la
+    # ocupación vista por el coche, solo repara los vértices afectados en lugar de replanear.
+    def __init__(self, graph: GrafoCalles, start: tuple[int, int], goal: tuple[int, int]):
+        self.graph = graph
+        self.start = graph.cell(start)
+        self.goal = graph.cell(goal)
+        self.last = self.start
+        self.km = 0
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.blocked = set()
+        self.queue = []
+        self.queued = {}
+        self.expanded = 0
+        self._push(self.goal)
+        self.compute_shortest_path()
+
+    def _h(self, a: int, b: int) -> int:
+        ax, ay = divmod(a, self.graph.height)
+        bx, by = divmod(b, self.graph.height)
+        return abs(ax - bx) + abs(ay - by)
+
+    def _key(self, cell: int) -> tuple[float, float]:
+        value = min(self.g.get(cell, inf), self.rhs.get(cell, inf))
+        return (value + self._h(self.start, cell) + self.km, value)
+
+    def _push(self, cell: int):
+        key = self._key(cell)
+        self.queued[cell] = key
+        heapq.heappush(self.queue, (key, cell))
+
+    def _top(self):
+        # Las entradas viejas del heap se descartan al llegar a la cima
+        while self.queue:
+            key, cell = self.queue[0]
+            if self.queued.get(cell) == key:
+                return key, cell
+            heapq.heappop(self.queue)
+        return None
+
+    def _successors(self, cell: int) -> list[int]:
+        # No se entra a otros estacionamientos que no sean el destino
+        is_parking = self.graph.is_parking
+        return [target for target in self.graph.successors[cell] if not is_parking[target] or target == self.goal]
+
+    def _predecessors(self, cell: int) -> list[int]:
+        if self.graph.is_parking[cell] and cell != self.goal:
+            return []
+        return self.graph.predecessors[cell]
+
+    def _cost(self, target: int) -> int:
+        return 1 + BLOCKED_PENALTY if target in self.blocked else 1
+
+    def _update_vertex(self, cell: int):
+        if cell != self.goal:
+            self.rhs[cell] = min((self._cost(target) + self.g.get(target, inf) for target in self._successors(cell)), default=inf)
+        self.queued.pop(cell, None)
+        if self.g.get(cell, inf) != self.rhs.get(cell, inf):
+            self._push(cell)
+
+    def compute_shortest_path(self):
+        while True:
+            top = self._top()
+            if top is None:
+                break
+            old_key, cell = top
+            if not (old_key < self._key(self.start) or self.rhs.get(self.start, inf) != self.g.get(self.start, inf)):
+                break
+            self.expanded += 1
+            new_key = self._key(cell)
+            if old_key < new_key:
+                self._push(cell)
+            elif self.g.get(cell, inf) > self.rhs.get(cell, inf):
+                self.g[cell] = self.rhs[cell]
+                self.queued.pop(cell)
+                for predecessor in self._predecessors(cell):
+                    self._update_vertex(predecessor)
+            else:
+                self.g[cell] = inf
+                self._update_vertex(cell)
+                for predecessor in self._predecessors(cell):
+                    self._update_vertex(predecessor)
+
+    def observe(self, pos: tuple[int, int], is_blocked):
+        # Mueve el inicio a la posición actual y aplica los cambios de ocupación que el coche ve
+        # en sus celdas vecinas; lo que sale de la vista deja de considerarse bloqueado
+        self.start = self.graph.cell(pos)
+        view = self._successors(self.start)
+        blocked_now = {cell for cell in view if is_blocked(self.graph.pos(cell))}
+        changed = [cell for cell in view if (cell in blocked_now) != (cell in self.blocked)]
+        changed += [cell for cell in self.blocked if cell not in view]
+        if not changed:
+            return
+
+        self.km += self._h(self.last, self.start)
+        self.last = self.start
+        self.blocked = blocked_now
+        for cell in changed:
+            for predecessor in self._predecessors(cell):
+                self._update_vertex(predecessor)
+        self.compute_shortest_path()
+
+    def next_cell(self):
+        # Mejor siguiente celda según costo + g, o None si el destino no es alcanzable
+        best, best_value = None, inf
+        for target in self._successors(self.start):
+            value = self._cost(target) + self.g.get(target, inf)
+            if value < best_value:
+                best, best_value = target, value
+        return None if best is None else self.graph.pos(best)
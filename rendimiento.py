@@ -0,0 +1,255 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from ciudad import CiudadModel, Calle, Coche, Edificio, Estacionamiento, Semaforo, successors
+from corridas import static_city
+from generador import generar_ciudad
+
+# Mediciones de las rutas calientes de las dos simulaciones: pasos (o llamadas) por segundo y
+# memoria pico. Los resultados se guardan como línea base en JSON y las corridas siguientes se
+# comparan contra ella para marcar regresiones.
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "Actividad_integradora"))
+from Simulacion import ModeloLimpiadores  # noqa: E402
+
+CITY_SIZES = [None, 60, 120]  # None es mapas/centro.json
+CAR_COUNTS = [25, 100, 400]
+CLEANER_SIZES = [24, 48, 96]
+CLEANER_COUNTS = [50, 200]
+STEP_WINDOW = 20  # pasos medidos por modelo recién construido
+
+def city_map(size):
+    return None if size is None else generar_ciudad(size, size, seed=0)
+
+def build_city(size, cars_number, seed=0, place_static=False, **options):
+    return CiudadModel(cars_number=cars_number, map_path=city_map(size), place_static=place_static, seed=seed, **options)
+
+def cars_of(model):
+    return [agent for agent in model.schedule.agents if isinstance(agent, Coche)]
+
+def measure(operation, min_seconds):
+    # Repite la operación hasta juntar al menos min_seconds; regresa operaciones por segundo
+    count, start = 0, time.perf_counter()
+    while True:
+        count += operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return count / elapsed
+
+def measure_steps(build, min_seconds, steps=STEP_WINDOW):
+    # Pasos por segundo en ventanas de steps pasos, cada una con un modelo recién construido (la
+    # construcción no cuenta): un solo modelo se va vaciando de coches y la carga dependería de
+    # cuánto dure la medición
+    count, elapsed = 0, 0.0
+    while elapsed < min_seconds:
+        model = build()
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        elapsed += time.perf_counter() - start
+        count += steps
+    return count / elapsed
+
+def peak_memory(build, operation):
+    tracemalloc.start()
+    operation(build())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+def city_step_case(size, cars_number, min_seconds, **options):
+    # Mapa y estructuras estáticas compartidos entre ventanas, como entre semillas en corridas.py
+    static = static_city(city_map(size), options.get("routing", "heuristic"))
+    rate = measure_steps(lambda: CiudadModel(cars_number=cars_number, place_static=False, seed=0, static=static, **options),
+                         min_seconds)
+    memory = peak_memory(lambda: build_city(size, cars_number, **options), lambda m: [m.step() for _ in range(5)])
+    return rate, memory
+
+def metrics_step_case(size, cars_number, min_seconds):
+    # Mismo caso que CiudadModel.step con el colector de métricas encendido
+    return city_step_case(size, cars_number, min_seconds, metrics=True)
+
+def successors_case(size, cars_number, min_seconds):
+    model = build_city(size, cars_number)
+    for _ in range(10):
+        model.step()
+    cars = cars_of(model)
+
+    def call():
+        for car in cars:
+            successors(car, car.pos)
+        return len(cars)
+    return measure(call, min_seconds), peak_memory(lambda: model, lambda m: call())
+
+def contar_coches_case(size, cars_number, min_seconds):
+    model = build_city(size, cars_number)
+    for _ in range(10):
+        model.step()
+
+    def call():
+        for semaforo in model.lista_semaforos:
+            semaforo.contar_coches()
+        return len(model.lista_semaforos)
+    return measure(call, min_seconds), peak_memory(lambda: model, lambda m: call())
+
+def static_agents_case(size, min_seconds):
+    # Construcción de Calle/Edificio/Estacionamiento de toda la ciudad: agentes por segundo
+    model = build_city(size, 0)
+
+    def build():
+        model.static_agents.clear()
+        model.grid = type(model.grid)(model.grid.width, model.grid.height, False)
+        model.build_static_agents()
+        return len(model.static_agents)
+
+    def fresh():
+        return build_city(size, 0)
+    return measure(build, min_seconds), peak_memory(fresh, lambda m: m.build_static_agents())
+
+def agent_footprint(count=20000) -> dict:
+    # Bytes por agente (objeto y sus atributos propios) y microsegundos por construcción
+    model = build_city(None, 0)
+    builders = {
+        "Calle": lambda i: Calle(i, model, ("Right",)),
+        "Edificio": lambda i: Edificio(i, model),
+        "Estacionamiento": lambda i: Estacionamiento(i, model, 1),
+        "Semaforo": lambda i: Semaforo(i, model, [(0, 0)], "Up"),
+        "Coche": lambda i: Coche(i, model, (0, 0), (1, 1)),
+    }
+    footprint = {}
+    for name, builder in builders.items():
+        tracemalloc.start()
+        start = time.perf_counter()
+        agents = [builder(i) for i in range(count)]
+        elapsed = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        footprint[name] = {"bytes_per_agent": memory / len(agents), "microseconds": elapsed / count * 1e6}
+    return footprint
+
+def render_case(size, cars_number, min_seconds, full_grid=False):
+    # Paso más un cuadro del servidor de visualización serializado a JSON, como lo manda el websocket
+    from mesa.visualization.modules import CanvasGrid # type: ignore
+    from visualizacion import CanvasCiudad, agent_portrayal
+    model = build_city(size, cars_number, place_static=full_grid)
+    width, height = model.grid.width, model.grid.height
+    element = CanvasGrid(agent_portrayal, width, height) if full_grid else CanvasCiudad(width, height)
+    element.render(model)
+
+    def frame():
+        model.step()
+        json.dumps(element.render(model))
+        return 1
+    return measure(frame, min_seconds), peak_memory(lambda: model, lambda m: frame())
+
+def render_full_case(size, cars_number, min_seconds):
+    return render_case(size, cars_number, min_seconds, full_grid=True)
+
+# Importaciones en un proceso nuevo, como las paga cada proceso de un pool: "mesa" sola es la base
+# contra la cual comparar los módulos del repositorio
+IMPORTS = {"mesa": "mesa", "ciudad": "ciudad", "Simulacion": "Simulacion"}
+
+def import_case(module, min_seconds):
+    # Procesos por segundo que arrancan e importan el módulo; memoria pico de la importación
+    root = Path(__file__).resolve().parent
+    path = os.pathsep.join([str(root), str(root / "Actividad_integradora")])
+    env = dict(os.environ, PYTHONPATH=path)
+
+    def start():
+        subprocess.run([sys.executable, "-c", f"import {module}"], env=env, check=True)
+        return 1
+    peak = subprocess.run([sys.executable, "-c", f"import tracemalloc; tracemalloc.start(); import {module}; "
+                           "print(tracemalloc.get_traced_memory()[1])"],
+                          env=env, check=True, capture_output=True, text=True).stdout
+    return measure(start, min_seconds), int(peak) / 1024
+
+def cleaners_step_case(size, cleaners, min_seconds):
+    def build():
+        random.seed(0)
+        np.random.seed(0)
+        return ModeloLimpiadores(size, size, cleaners, 20, 10 ** 9)
+    model = build()
+
+    def step():
+        model.step()
+        return 1
+    return measure(step, min_seconds), peak_memory(build, lambda m: [m.step() for _ in range(5)])
+
+def cases(quick=False):
+    sizes, counts = (CITY_SIZES[:2], CAR_COUNTS[:2]) if quick else (CITY_SIZES, CAR_COUNTS)
+    for size in sizes:
+        label = "centro" if size is None else f"{size}x{size}"
+        for cars_number in counts:
+            yield f"CiudadModel.step[{label},{cars_number}]", city_step_case, (size, cars_number)
+            yield f"CiudadModel.step+metricas[{label},{cars_number}]", metrics_step_case, (size, cars_number)
+            yield f"successors[{label},{cars_number}]", successors_case, (size, cars_number)
+            yield f"Semaforo.contar_coches[{label},{cars_number}]", contar_coches_case, (size, cars_number)
+        yield f"CiudadModel.build_static_agents[{label}]", static_agents_case, (size,)
+        yield f"render CanvasGrid[{label},{counts[0]}]", render_full_case, (size, counts[0])
+        yield f"render CanvasCiudad[{label},{counts[0]}]", render_case, (size, counts[0])
+    for label, module in IMPORTS.items():
+        yield f"import[{label}]", import_case, (module,)
+    for size in CLEANER_SIZES[:2] if quick else CLEANER_SIZES:
+        for cleaners in CLEANER_COUNTS:
+            yield f"ModeloLimpiadores.step[{size}x{size},{cleaners}]", cleaners_step_case, (size, cleaners)
+
+def run(quick=False, min_seconds=0.5, only=None) -> dict:
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        for name, case, args in cases(quick):
+            if only and only not in name:
+                continue
+            with contextlib.redirect_stdout(devnull):
+                rate, memory = case(*args, min_seconds)
+            results[name] = {"ops_per_second": rate, "peak_kib": memory}
+            print(f"{name:55s} {rate:12.1f} ops/s {memory:10.1f} KiB")
+    return {"python": platform.python_version(), "machine": platform.platform(), "results": results}
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    # Regresión: más lento que la línea base por encima de la tolerancia (o más memoria)
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        if result["ops_per_second"] < base["ops_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ops_per_second']:.1f} ops/s (base {base['ops_per_second']:.1f})")
+        if result["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['peak_kib']:.1f} KiB (base {base['peak_kib']:.1f})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de CiudadModel y ModeloLimpiadores")
+    parser.add_argument("--save", help="guarda los resultados como línea base JSON")
+    parser.add_argument("--compare", help="línea base JSON contra la cual comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-seconds", type=float, default=0.5)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--only", help="solo los casos cuyo nombre contiene este texto")
+    parser.add_argument("--agents", action="store_true", help="solo bytes por agente y tiempo de construcción")
+    args = parser.parse_args()
+
+    if args.agents:
+        for name, result in agent_footprint().items():
+            print(f"{name:20s} {result['bytes_per_agent']:8.1f} B/agente {result['microseconds']:8.2f} us")
+        sys.exit(0)
+
+    current = run(args.quick, args.min_seconds, args.only)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(current, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(current, json.load(file), args.tolerance)
+        for regression in regressions:
+            print("REGRESIÓN", regression)
+        sys.exit(1 if regressions else 0)
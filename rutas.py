@@ -0,0 +1,341 @@
+from functools import cached_property
+import numpy as np
+from capas import KIND_STREET, KIND_BUILDING, KIND_PARKING, MOVES, ORIENTATION_BITS, parking_positions
+
+def street_moves(cell_kind: np.ndarray, cell_orientation: np.ndarray) -> np.ndarray:
+    # Grafo dirigido de la ciudad como tabla (celdas x 4 movimientos) -> celda destino o -1.
+    # Las celdas se indexan en plano: x * alto + y
+    width, height = cell_kind.shape
+    cells = np.arange(width * height, dtype=np.int32).reshape(width, height)
+    moves = np.full((width, height, len(MOVES)), -1, dtype=np.int32)
+    is_street = (cell_kind & KIND_STREET) > 0
+
+    for move_index, (_, (dx, dy)) in enumerate(MOVES):
+        # Región de origen cuyo vecino en (dx, dy) queda dentro de la grid
+        source = (slice(max(0, -dx), width - max(0, dx)), slice(max(0, -dy), height - max(0, dy)))
+        target = (slice(max(0, dx), width - max(0, -dx)), slice(max(0, dy), height - max(0, -dy)))
+        # A un estacionamiento se entra desde cualquier celda vecina (solo si es el destino)
+        legal = (cell_orientation[source] & (1 << move_index)) > 0
+        allowed = is_street[source] & (((cell_kind[target] & KIND_PARKING) > 0) | (legal & is_street[target]))
+        moves[source + (move_index,)] = np.where(allowed, cells[target], -1)
+    return moves.reshape(width * height, len(MOVES))
+
+def predecessor_csr(moves: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Grafo inverso en CSR: las celdas que llegan a c son sources[offsets[c]:offsets[c + 1]]
+    cells = np.repeat(np.arange(len(moves), dtype=np.int32), moves.shape[1]).reshape(moves.shape)
+    valid = moves >= 0
+    targets, sources = moves[valid], cells[valid]
+    order = np.argsort(targets, kind="stable")
+    offsets = np.zeros(len(moves) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=len(moves)), out=offsets[1:])
+    return offsets, sources[order]
+
+def predecessor_lists(moves: np.ndarray) -> list[list[int]]:
+    offsets, sources = predecessor_csr(moves)
+    sources = sources.tolist()
+    return [sources[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+def reverse_bfs(predecessor_offsets, predecessor_sources, is_parking: np.ndarray, destinations,
+                dtype=np.int32) -> np.ndarray:
+    # Distancia (en pasos) de cada celda a cada estacionamiento destino (fila por destino), -1 si no
+    # se puede llegar. BFS por frentes para todos los destinos a la vez: el frente son pares
+    # (destino, celda) como índices planos y cada nivel junta de una vez todos sus predecesores
+    destinations = np.asarray(destinations, dtype=np.int64)
+    cells = len(predecessor_offsets) - 1
+    dist = np.full((len(destinations), cells), -1, dtype=dtype)
+    flat = dist.reshape(-1)
+    frontier = np.arange(len(destinations), dtype=np.int64) * cells + destinations
+    flat[frontier] = 0
+    slot = np.empty(len(flat), dtype=np.int32)
+    level = 0
+    while len(frontier):
+        level += 1
+        rows, frontier_cells = np.divmod(frontier, cells)
+        starts = predecessor_offsets[frontier_cells]
+        counts = predecessor_offsets[frontier_cells + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            break
+        shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        candidates = np.repeat(rows * cells, counts) + predecessor_sources[np.arange(total) + shift]
+        candidates = candidates[flat[candidates] < 0]
+        # Sin duplicados y sin ordenar: cada celda se queda con el último candidato que la escribió
+        slot[candidates] = np.arange(len(candidates), dtype=np.int32)
+        candidates = candidates[slot[candidates] == np.arange(len(candidates))]
+        flat[candidates] = level
+        # Los otros estacionamientos solo pueden ser origen, no se atraviesan
+        frontier = candidates[~is_parking[candidates % cells]]
+    return dist
+
+class GrafoCalles:
+    # Grafo dirigido compartido por la tabla de rutas y los planificadores de cada coche
+    def __init__(self, cell_kind: np.ndarray, cell_orientation: np.ndarray):
+        self.width, self.height = cell_kind.shape
+        self.moves = street_moves(cell_kind, cell_orientation)
+        self.is_parking = (cell_kind.ravel() & KIND_PARKING) > 0
+        self.predecessor_offsets, self.predecessor_sources = predecessor_csr(self.moves)
+
+    # Listas de Python para D* Lite; solo se arman si algún coche planea con D*
+    @cached_property
+    def successors(self) -> list[list[int]]:
+        return [[target for target in targets if target >= 0] for targets in self.moves.tolist()]
+
+    @cached_property
+    def predecessors(self) -> list[list[int]]:
+        sources = self.predecessor_sources.tolist()
+        offsets = self.predecessor_offsets.tolist()
+        return [sources[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def cell(self, pos: tuple[int, int]) -> int:
+        return pos[0] * self.height + pos[1]
+
+    def pos(self, cell: int) -> tuple[int, int]:
+        return divmod(cell, self.height)
+
+# Banderas de cada arista del grafo de transiciones
+EDGE_LEGAL = 1    # de calle a calle en una orientación de la celda de origen
+EDGE_PARKING = 2  # entrada a un estacionamiento vecino (solo se toma si es el destino)
+EDGE_OPEN = 4     # la celda vecina no es edificio
+
+# Vecinos en el orden de neighbour_cells: izquierda, derecha, abajo, arriba
+NEIGHBOUR_MOVES = [("Left", (-1, 0)), ("Right", (1, 0)), ("Down", (0, -1)), ("Up", (0, 1))]
+
+def transition_csr(cell_kind: np.ndarray, cell_orientation: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (offsets, targets, flags): las aristas de la celda c son targets[offsets[c]:offsets[c + 1]],
+    # en el orden de NEIGHBOUR_MOVES. Los vecinos que son solo edificio no llevan arista
+    width, height = cell_kind.shape
+    cells = np.arange(width * height, dtype=np.int32).reshape(width, height)
+    targets = np.full((width, height, len(NEIGHBOUR_MOVES)), -1, dtype=np.int32)
+    flags = np.zeros((width, height, len(NEIGHBOUR_MOVES)), dtype=np.uint8)
+
+    for slot, (name, (dx, dy)) in enumerate(NEIGHBOUR_MOVES):
+        source = (slice(max(0, -dx), width - max(0, dx)), slice(max(0, -dy), height - max(0, dy)))
+        target = (slice(max(0, dx), width - max(0, -dx)), slice(max(0, dy), height - max(0, -dy)))
+        kind = cell_kind[target]
+        legal = ((cell_orientation[source] & ORIENTATION_BITS[name]) > 0) & ((kind & KIND_STREET) > 0)
+        targets[source + (slot,)] = cells[target]
+        flags[source + (slot,)] = (np.where(legal, EDGE_LEGAL, 0) | np.where(kind & KIND_PARKING, EDGE_PARKING, 0)
+                                   | np.where(kind & KIND_BUILDING, 0, EDGE_OPEN))
+
+    targets = targets.reshape(width * height, -1)
+    flags = flags.reshape(width * height, -1)
+    keep = (targets >= 0) & (flags > 0)
+    offsets = np.zeros(width * height + 1, dtype=np.int32)
+    np.cumsum(keep.sum(axis=1), out=offsets[1:])
+    return offsets, targets[keep], flags[keep]
+
+class GrafoTransiciones:
+    # Movimientos de la ciudad compilados una vez al construir el modelo. La consulta de sucesores
+    # de cada coche es una rebanada de las aristas de su celda más un filtro por ocupación
+    def __init__(self, cell_kind: np.ndarray, cell_orientation: np.ndarray):
+        self.width, self.height = cell_kind.shape
+        self.offsets, self.targets, self.flags = transition_csr(cell_kind, cell_orientation)
+        # Las mismas aristas en listas de Python: rebanar listas es más rápido que rebanar arreglos
+        # cuando cada celda tiene a lo más cuatro aristas
+        self.offset_list = self.offsets.tolist()
+        self.target_list = self.targets.tolist()
+        self.flag_list = self.flags.tolist()
+        self.position_list = [divmod(target, self.height) for target in self.target_list]
+
+    def cell(self, pos: tuple[int, int]) -> int:
+        return pos[0] * self.height + pos[1]
+
+    def edges(self, pos: tuple[int, int]) -> tuple[list, list, list]:
+        # (posiciones, celdas planas, banderas) de las aristas que salen de pos
+        cell = pos[0] * self.height + pos[1]
+        start, end = self.offset_list[cell], self.offset_list[cell + 1]
+        return self.position_list[start:end], self.target_list[start:end], self.flag_list[start:end]
+
+    def subgraph(self, mask: int) -> tuple[np.ndarray, np.ndarray]:
+        # CSR solo con las aristas que tienen alguna de las banderas de mask, para rutas y análisis
+        # (mask=EDGE_LEGAL | EDGE_PARKING es la relación de movimientos legales)
+        keep = (self.flags & mask) > 0
+        offsets = np.zeros_like(self.offsets)
+        sources = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        np.cumsum(np.bincount(sources[keep], minlength=len(self.offsets) - 1), out=offsets[1:])
+        return offsets, self.targets[keep]
+
+def strongly_connected_components(offsets: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    # Tarjan iterativo sobre un CSR. Las componentes se numeran en orden topológico inverso:
+    # una componente recibe su número después de todas las que alcanza
+    offsets, targets = offsets.tolist(), targets.tolist()
+    cells = len(offsets) - 1
+    index, low = [-1] * cells, [0] * cells
+    on_stack = [False] * cells
+    component = [-1] * cells
+    stack, counter, count = [], 0, 0
+    for root in range(cells):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [[root, offsets[root]]]
+        while work:
+            frame = work[-1]
+            node, edge = frame
+            if edge < offsets[node + 1]:
+                frame[1] += 1
+                target = targets[edge]
+                if index[target] < 0:
+                    index[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = True
+                    work.append([target, offsets[target]])
+                elif on_stack[target] and index[target] < low[node]:
+                    low[node] = index[target]
+                continue
+            work.pop()
+            if work and low[node] < low[work[-1][0]]:
+                low[work[-1][0]] = low[node]
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = count
+                    if member == node:
+                        break
+                count += 1
+    return np.array(component, dtype=np.int32)
+
+def parking_reachability(graph: GrafoTransiciones, parking_cells) -> np.ndarray:
+    # reachable[o, d]: un coche que sale del estacionamiento o puede llegar al d por movimientos
+    # legales. Los otros estacionamientos no se atraviesan, así que en el grafo de componentes no
+    # tienen salidas; el alcance de cada componente es la unión (máscara de bits) de los
+    # estacionamientos que alcanzan sus sucesoras, que por el orden de Tarjan ya están calculadas
+    parking_cells = np.asarray(parking_cells, dtype=np.int64)
+    offsets, targets = graph.subgraph(EDGE_LEGAL | EDGE_PARKING)
+    cells = len(offsets) - 1
+    is_parking = np.zeros(cells, dtype=bool)
+    is_parking[parking_cells] = True
+    sources = np.repeat(np.arange(cells), np.diff(offsets))
+    through = ~is_parking[sources]
+    street_offsets = np.zeros_like(offsets)
+    np.cumsum(np.bincount(sources[through], minlength=cells), out=street_offsets[1:])
+    component = strongly_connected_components(street_offsets, targets[through])
+
+    masks = [0] * (int(component.max()) + 1 if cells else 0)
+    for index, cell in enumerate(parking_cells.tolist()):
+        masks[component[cell]] = 1 << index
+    source_component = component[sources[through]]
+    target_component = component[targets[through]]
+    cross = source_component != target_component
+    order = np.argsort(source_component[cross], kind="stable")
+    for source, target in zip(source_component[cross][order].tolist(), target_component[cross][order].tolist()):
+        masks[source] |= masks[target]
+
+    reachable = np.zeros((len(parking_cells), len(parking_cells)), dtype=bool)
+    size = (len(parking_cells) + 7) // 8
+    for index, cell in enumerate(parking_cells.tolist()):
+        mask = 0
+        for target in targets[offsets[cell]:offsets[cell + 1]].tolist():
+            mask |= masks[component[target]]
+        mask &= ~(1 << index)
+        bits = np.unpackbits(np.frombuffer(mask.to_bytes(size, "little"), dtype=np.uint8), bitorder="little")
+        reachable[index] = bits[:len(parking_cells)]
+    return reachable
+
+def spawn_pairs(reachable: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (origins, offsets, destinations): estacionamientos de los que se puede salir y, en CSR, los
+    # destinos alcanzables de cada uno en orden de idParking. Si todos los pares tienen camino,
+    # sortear un índice en cada lista da los mismos pares que el sorteo uniforme de siempre
+    counts = reachable.sum(axis=1)
+    offsets = np.zeros(len(reachable) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return np.flatnonzero(counts), offsets, np.nonzero(reachable)[1]
+
+def unreachable_pairs(reachable: np.ndarray, parkings) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+    origins, destinations = np.nonzero(~reachable)
+    return [(parkings[origin], parkings[destination])
+            for origin, destination in zip(origins.tolist(), destinations.tolist()) if origin != destination]
+
+ROUTE_BATCH = 64  # destinos por BFS en TablaRutas.ensure
+
+class TablaRutas:
+    # Distancias de cada celda a cada estacionamiento destino, calculadas la primera vez que un
+    # coche va a ese destino: una fila por destino usado, no una por estacionamiento del mapa.
+    # El siguiente paso se deduce de la fila (celdas vecinas a una unidad menos de distancia)
+    def __init__(self, cell_kind: np.ndarray, cell_orientation: np.ndarray, parking_id: np.ndarray, graph: GrafoCalles = None):
+        self.graph = graph if graph is not None else GrafoCalles(cell_kind, cell_orientation)
+        self.width, self.height = cell_kind.shape
+        self.parkings = parking_positions(parking_id)
+        self.destination_index = {pos: index for index, pos in enumerate(self.parkings)}
+        self.parking_cells = np.array([x * self.height + y for x, y in self.parkings], dtype=np.int64)
+        self.moves = self.graph.moves
+        self.is_parking = self.graph.is_parking
+        # Una distancia no pasa del número de celdas que puede recorrer un coche
+        self.dtype = np.int16 if np.count_nonzero(cell_kind & KIND_STREET) < np.iinfo(np.int16).max else np.int32
+
+        # dist: fila x celda para los destinos ya usados; row_of: destino -> fila (-1 sin calcular)
+        self.dist = np.zeros((0, len(self.moves)), dtype=self.dtype)
+        self.row_of = np.full(len(self.parkings), -1, dtype=np.int64)
+        self.rows = 0
+
+    def ensure(self, destinations) -> np.ndarray:
+        # Calcula las filas que falten de estos destinos (índices de estacionamiento); regresa sus filas
+        destinations = np.atleast_1d(np.asarray(destinations, dtype=np.int64))
+        missing = np.unique(destinations[self.row_of[destinations] < 0])
+        if len(missing):
+            if self.rows + len(missing) > len(self.dist):
+                # La capacidad se duplica, como BufferColumnas, para no copiar en cada destino nuevo
+                capacity = max(2 * len(self.dist), self.rows + len(missing))
+                grown = np.zeros((capacity, len(self.moves)), dtype=self.dtype)
+                grown[:self.rows] = self.dist[:self.rows]
+                self.dist = grown
+            # Por bloques de destinos: un BFS por frentes para todo el bloque
+            for first in range(0, len(missing), ROUTE_BATCH):
+                batch = missing[first:first + ROUTE_BATCH]
+                self.dist[self.rows:self.rows + len(batch)] = reverse_bfs(
+                    self.graph.predecessor_offsets, self.graph.predecessor_sources, self.is_parking,
+                    self.parking_cells[batch], self.dtype)
+                self.row_of[batch] = np.arange(self.rows, self.rows + len(batch))
+                self.rows += len(batch)
+        return self.row_of[destinations]
+
+    def destination_dist(self, index: int) -> np.ndarray:
+        row = self.row_of[index]
+        if row < 0:
+            row = self.ensure(index)[0]
+        return self.dist[row]
+
+    def distance(self, pos: tuple[int, int], destination_parking: tuple[int, int]) -> int:
+        x, y = pos
+        return int(self.destination_dist(self.destination_index[destination_parking])[x * self.height + y])
+
+    def next_moves(self, pos: tuple[int, int], destination_parking: tuple[int, int]) -> list[tuple[int, int]]:
+        # Siguientes celdas sobre un camino más corto, en el orden de MOVES (la primera es la preferida).
+        # Un paso es útil si acerca una unidad al destino y no entra a otro estacionamiento
+        x, y = pos
+        cell = x * self.height + y
+        index = self.destination_index[destination_parking]
+        dist = self.destination_dist(index)
+        remaining = int(dist[cell])
+        if remaining <= 0:
+            return []
+        destination = int(self.parking_cells[index])
+        return [divmod(target, self.height) for target in self.moves[cell].tolist()
+                if target >= 0 and dist[target] == remaining - 1 and (not self.is_parking[target] or target == destination)]
+
+if __name__ == "__main__":
+    import argparse
+    from mapa import load_map
+    parser = argparse.ArgumentParser(description="Reporta los pares de estacionamientos sin camino de un mapa")
+    parser.add_argument("map_path", nargs="?", default=None)
+    args = parser.parse_args()
+
+    mapa = load_map(args.map_path)
+    graph = GrafoTransiciones(mapa.cell_kind, mapa.cell_orientation)
+    parkings = parking_positions(mapa.parking_id)
+    reachable = parking_reachability(graph, [graph.cell(pos) for pos in parkings])
+    pairs = unreachable_pairs(reachable, parkings)
+    # Componentes fuertemente conexas de las calles: en una ciudad sana casi todo es una sola
+    components = strongly_connected_components(*graph.subgraph(EDGE_LEGAL))
+    kind = mapa.cell_kind.ravel()
+    sizes = np.bincount(components[((kind & KIND_STREET) > 0) & ((kind & KIND_PARKING) == 0)])
+    sizes = sizes[sizes > 0]
+    print(f"{mapa.name}: {len(sizes)} componentes de calles (la mayor con {sizes.max()} de {sizes.sum()} celdas), "
+          f"{len(parkings)} estacionamientos, {len(pairs)} de {len(parkings) * (len(parkings) - 1)} pares sin camino")
+    for origin, destination in pairs:
+        print(f"  {origin} -> {destination}")
@@ -0,0 +1,147 @@
+import heapq
+from abc import ABC, abstractmethod
+import numpy as np
+from capas import sensing_windows
+
+# Controladores de semáforos. Cada par de model.pares_semaforos es una intersección con dos fases:
+# verde para el primer semáforo o verde para el segundo. Salvo "queue" (la regla original, que
+# compara colas en cada paso), los controladores guardan en un heap el paso en que vence la fase
+# de cada intersección y solo trabajan cuando ese paso llega.
+
+OPPOSITE = {"Up": "Down", "Down": "Up", "Left": "Right", "Right": "Left"}
+
+class ControladorSemaforos(ABC):
+    def __init__(self, model):
+        self.model = model
+        self.pairs = [(model.lista_semaforos[first], model.lista_semaforos[second])
+                      for first, second in model.pares_semaforos]
+        self.start_step = model.count_steps
+        self.start_crossings = model.light_crossings.copy()
+
+    @abstractmethod
+    def step(self, now: int):
+        pass
+
+    def throughput(self) -> np.ndarray:
+        # Coches por paso que cruzaron cada intersección desde que arrancó el controlador
+        crossings = self.model.light_crossings - self.start_crossings
+        steps = max(self.model.count_steps - self.start_step, 1)
+        return np.array([crossings[first.index] + crossings[second.index] for first, second in self.pairs],
+                        dtype=float) / steps
+
+class ControladorColas(ControladorSemaforos):
+    # Regla original: en cada paso el semáforo con más coches esperando se pone en verde
+    def step(self, now: int):
+        for semaforo1, semaforo2 in self.pairs:
+            self.model.comparar_semaforos(semaforo1, semaforo2)
+
+class ControladorPorFases(ControladorSemaforos):
+    def __init__(self, model):
+        super().__init__(model)
+        self.phase = [0] * len(self.pairs)
+        self.heap = []
+        now = model.count_steps
+        for pair in range(len(self.pairs)):
+            self.set_phase(pair, 0, now)
+            heapq.heappush(self.heap, (now + self.initial_delay(pair), pair))
+
+    def green(self, pair):
+        return self.pairs[pair][self.phase[pair]]
+
+    def red(self, pair):
+        return self.pairs[pair][1 - self.phase[pair]]
+
+    def set_phase(self, pair, phase, now):
+        self.phase[pair] = phase
+        self.green(pair).state, self.red(pair).state = "green", "red"
+        # timer: paso en que empezó la fase actual del semáforo
+        self.green(pair).timer = self.red(pair).timer = now
+
+    def switch(self, pair, now):
+        self.set_phase(pair, 1 - self.phase[pair], now)
+
+    def step(self, now: int):
+        while self.heap and self.heap[0][0] <= now:
+            _, pair = heapq.heappop(self.heap)
+            heapq.heappush(self.heap, (now + self.decide(pair, now), pair))
+
+    # Cada controlador define cuánto dura la primera fase y qué hacer cuando vence una fase;
+    # decide() regresa en cuántos pasos se vuelve a revisar la intersección
+    @abstractmethod
+    def initial_delay(self, pair) -> int:
+        pass
+
+    @abstractmethod
+    def decide(self, pair, now) -> int:
+        pass
+
+class ControladorFijo(ControladorPorFases):
+    # Tiempo fijo: cada semáforo dura en verde su change_threshold
+    def initial_delay(self, pair) -> int:
+        return self.green(pair).change_threshold
+
+    def decide(self, pair, now) -> int:
+        self.switch(pair, now)
+        return self.green(pair).change_threshold
+
+class ControladorActuado(ControladorPorFases):
+    # Actuado: el verde dura al menos min_green; después se extiende de extension en extension
+    # mientras tenga coches en su ventana, y cambia en cuanto se vacía (si el otro tiene coches)
+    # o al llegar a max_green
+    def __init__(self, model, min_green=4, max_green=20, extension=2):
+        if not 0 < min_green <= max_green or extension <= 0:
+            raise ValueError("Actuated control needs 0 < min_green <= max_green and extension > 0")
+        self.min_green = min_green
+        self.max_green = max_green
+        self.extension = extension
+        super().__init__(model)
+
+    def initial_delay(self, pair) -> int:
+        return self.min_green
+
+    def decide(self, pair, now) -> int:
+        queues = self.model.queue_lengths()
+        waiting_green, waiting_red = queues[self.green(pair).index], queues[self.red(pair).index]
+        elapsed = now - self.green(pair).timer
+        if waiting_red and (not waiting_green or elapsed >= self.max_green):
+            self.switch(pair, now)
+            return self.min_green
+        return max(min(self.extension, self.max_green - elapsed), 1)
+
+class ControladorPresion(ControladorPorFases):
+    # Max-pressure: cada period pasos el verde va al semáforo con mayor presión, es decir, coches
+    # en su ventana de llegada menos coches en las celdas de salida (empates: se queda la fase)
+    def __init__(self, model, period=4):
+        if period <= 0:
+            raise ValueError("Max-pressure control needs period > 0")
+        self.period = period
+        lights = [(semaforo.positions, OPPOSITE[semaforo.orientation]) for semaforo in model.lista_semaforos]
+        self.exit_cells, self.exit_owner = sensing_windows(lights, model.grid.width, model.grid.height)
+        self._pressure = None
+        self._pressure_step = -1
+        super().__init__(model)
+
+    def initial_delay(self, pair) -> int:
+        return self.period
+
+    def pressure(self, now) -> np.ndarray:
+        if self._pressure_step != now:
+            downstream = np.bincount(self.exit_owner, weights=self.model.occupancy.ravel()[self.exit_cells],
+                                     minlength=len(self.model.lista_semaforos))
+            self._pressure = self.model.queue_lengths() - downstream
+            self._pressure_step = now
+        return self._pressure
+
+    def decide(self, pair, now) -> int:
+        pressure = self.pressure(now)
+        if pressure[self.red(pair).index] > pressure[self.green(pair).index]:
+            self.switch(pair, now)
+        return self.period
+
+POLICIES = {"queue": ControladorColas, "fixed": ControladorFijo, "actuated": ControladorActuado,
+            "max_pressure": ControladorPresion}
+
+def make_controller(policy: str, model, **options) -> ControladorSemaforos:
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown light policy: {policy}")
+    return POLICIES[policy](model, **options)
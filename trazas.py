@@ -0,0 +1,104 @@
+import json
+import numpy as np
+
+# Trazas de la simulación: en lugar de print() por coche y por paso, los eventos se guardan como
+# registros fijos en un buffer circular en memoria y se escriben en bloque a un archivo binario
+# (o JSONL). Con el nivel apagado el único costo es revisar el nivel.
+
+TRACE_OFF = 0
+TRACE_SUMMARY = 1   # un evento por paso con los agregados
+TRACE_PER_CAR = 2   # además, salida, decisión, movimiento y llegada de cada coche
+
+EVENT_STEP = 0
+EVENT_SPAWN = 1
+EVENT_DECISION = 2
+EVENT_MOVE = 3
+EVENT_ARRIVAL = 4
+EVENT_NAMES = ["step", "spawn", "decision", "move", "arrival"]
+
+# step: paso del modelo; car: id del coche (-1 en eventos de paso); x, y: celda del evento.
+# a, b, c según el evento:
+#   step: a = llegadas, b = movimientos, c = coches activos
+#   spawn: (a, b) = estacionamiento destino
+#   decision: (a, b) = mejor sucesor (-1 si no hay), c = número de sucesores distintos
+#   move: (a, b) = celda anterior
+#   arrival: c = duración del viaje en pasos
+EVENT_DTYPE = np.dtype([("step", "<i4"), ("kind", "u1"), ("car", "<i4"),
+                        ("x", "<i2"), ("y", "<i2"), ("a", "<i2"), ("b", "<i2"), ("c", "<i4")])
+
+class Trazador:
+    def __init__(self, level=TRACE_OFF, capacity=65536, path=None, format="binary"):
+        if format not in ("binary", "jsonl"):
+            raise ValueError(f"Unknown trace format: {format}")
+        self.level = level
+        self.path = path
+        self.format = format
+        self.buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self.count = 0  # eventos desde el último flush; sin archivo el buffer da la vuelta
+        self.step = 0
+        self.step_arrivals = 0
+        self.step_moves = 0
+        if path is not None:
+            open(path, "wb").close()
+
+    def record(self, kind, car=-1, x=-1, y=-1, a=-1, b=-1, c=-1):
+        if self.count == len(self.buffer) and self.path is not None:
+            self.flush()
+        self.buffer[self.count % len(self.buffer)] = (self.step, kind, car, x, y, a, b, c)
+        self.count += 1
+
+    # Eventos por coche
+    def spawn(self, car, origin, destination):
+        if self.level >= TRACE_PER_CAR:
+            self.record(EVENT_SPAWN, car, origin[0], origin[1], destination[0], destination[1])
+
+    def decision(self, car, pos, best, successors_count):
+        if self.level >= TRACE_PER_CAR:
+            best_x, best_y = best if best is not None else (-1, -1)
+            self.record(EVENT_DECISION, car, pos[0], pos[1], best_x, best_y, successors_count)
+
+    def move(self, car, old_pos, new_pos):
+        self.step_moves += 1
+        if self.level >= TRACE_PER_CAR:
+            self.record(EVENT_MOVE, car, new_pos[0], new_pos[1], old_pos[0], old_pos[1])
+
+    def arrival(self, car, pos, trip_time):
+        self.step_arrivals += 1
+        if self.level >= TRACE_PER_CAR:
+            self.record(EVENT_ARRIVAL, car, pos[0], pos[1], c=trip_time)
+
+    # Resumen por paso
+    def end_step(self, active_cars):
+        if self.level >= TRACE_SUMMARY:
+            self.record(EVENT_STEP, a=self.step_arrivals, b=self.step_moves, c=active_cars)
+        self.step += 1
+        self.step_arrivals = 0
+        self.step_moves = 0
+
+    def events(self) -> np.ndarray:
+        # Eventos en memoria en orden cronológico (sin archivo, solo los últimos `capacity`)
+        capacity = len(self.buffer)
+        if self.count <= capacity:
+            return self.buffer[:self.count].copy()
+        start = self.count % capacity
+        return np.concatenate([self.buffer[start:], self.buffer[:start]])
+
+    def flush(self):
+        if self.path is None or not self.count:
+            return
+        events = self.buffer[:self.count]
+        with open(self.path, "ab") as file:
+            if self.format == "binary":
+                events.tofile(file)
+            else:
+                file.write("".join(json.dumps(event_dict(event)) + "\n" for event in events).encode())
+        self.count = 0
+
+def event_dict(event) -> dict:
+    row = {name: int(event[name]) for name in EVENT_DTYPE.names}
+    row["kind"] = EVENT_NAMES[row["kind"]]
+    return row
+
+def read_trace(path) -> np.ndarray:
+    # Lee un archivo binario escrito por Trazador.flush()
+    return np.fromfile(path, dtype=EVENT_DTYPE)
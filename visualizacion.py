@@ -0,0 +1,69 @@
+from pathlib import Path
+import numpy as np
+from mesa.visualization.ModularVisualization import VisualizationElement # type: ignore
+from capas import KIND_STREET, KIND_BUILDING, KIND_PARKING
+
+# Representación de cada tipo de agente en el canvas. CanvasGrid le agrega x/y a cada dict, así
+# que agent_portrayal entrega copias; CanvasCiudad manda cada estilo una sola vez por modelo
+PORTRAYALS = {
+    "Coche": {"Shape": "circle", "Filled": "true", "Layer": 1, "Color": "purple", "r": 1},
+    "Edificio": {"Shape": "rect", "Filled": "true", "Layer": 1, "Color": "blue", "w": 1, "h": 1},
+    "Estacionamiento": {"Shape": "rect", "Filled": "true", "Layer": 1, "Color": "yellow", "w": 1, "h": 1},
+    "Calle": {"Shape": "circle", "Filled": "true", "Layer": 1, "Color": "black", "r": 0.5},
+    "green": {"Shape": "rect", "Filled": "true", "Layer": 1, "Color": "green", "w": 1, "h": 1},
+    "red": {"Shape": "rect", "Filled": "true", "Layer": 1, "Color": "red", "w": 1, "h": 1},
+}
+
+def agent_portrayal(agent) -> dict:
+    # Para CanvasGrid; un Semaforo se pinta del color de su estado
+    name = type(agent).__name__
+    return dict(PORTRAYALS[agent.state if name == "Semaforo" else name])
+
+# Estilo de fondo de cada celda: en CanvasGrid gana el último agente dibujado de la celda
+# (Calle, luego Edificio, luego Estacionamiento) y los rectángulos la cubren completa
+STATIC_STYLES = ["Calle", "Edificio", "Estacionamiento"]
+
+def static_cells(cell_kind: np.ndarray) -> list[list[int]]:
+    # [x, y, índice en STATIC_STYLES] de cada celda con algo que dibujar
+    style = np.full(cell_kind.shape, -1, dtype=np.int64)
+    for index, kind in enumerate((KIND_STREET, KIND_BUILDING, KIND_PARKING)):
+        style[(cell_kind & kind) > 0] = index
+    xs, ys = np.nonzero(style >= 0)
+    return np.column_stack([xs, ys, style[xs, ys]]).tolist()
+
+class CanvasCiudad(VisualizationElement):
+    # Alternativa a CanvasGrid para CiudadModel: el fondo (calles, edificios, estacionamientos y
+    # la posición de los semáforos) se manda una vez por modelo y el navegador lo dibuja en su
+    # propio canvas. Después cada cuadro lleva solo las celdas con coches y los semáforos que
+    # cambiaron de color, así que no depende de los agentes estáticos (sirve con place_static=False)
+    package_includes = ["GridDraw.js"]
+    local_includes = ["ciudad_canvas.js"]
+    local_dir = str(Path(__file__).resolve().parent / "web")
+
+    def __init__(self, grid_width, grid_height, canvas_width=500, canvas_height=500):
+        super().__init__()
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.js_code = (f"elements.push(new CiudadCanvasModule({canvas_width}, {canvas_height}, "
+                        f"{grid_width}, {grid_height}));")
+        self.model = None
+        self.light_green = None
+
+    def render(self, model):
+        green = np.array([semaforo.state == "green" for semaforo in model.lista_semaforos], dtype=bool)
+        xs, ys = np.nonzero(model.occupancy)
+        frame = {"cars": np.column_stack([xs, ys]).ravel().tolist()}
+        if model is not self.model:
+            # Modelo nuevo (el navegador pide reset al abrir la página): fondo completo
+            self.model = model
+            frame["static"] = {"styles": [PORTRAYALS[name] for name in STATIC_STYLES],
+                               "cells": static_cells(model.cell_kind),
+                               "lights": [[list(pos) for pos in semaforo.positions] for semaforo in model.lista_semaforos],
+                               "light_styles": [PORTRAYALS["red"], PORTRAYALS["green"]],
+                               "car": PORTRAYALS["Coche"]}
+            changed = np.arange(len(green))
+        else:
+            changed = np.flatnonzero(green != self.light_green)
+        self.light_green = green
+        frame["lights"] = [[index, int(green[index])] for index in changed.tolist()]
+        return frame
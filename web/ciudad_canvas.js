@@ -0,0 +1,55 @@
+// Canvas de CiudadModel (visualizacion.CanvasCiudad): el fondo se dibuja una vez en su propio
+// canvas y en cada cuadro solo se redibujan semáforos y coches en el canvas de encima.
+// Usa GridVisualization de GridDraw.js (Mesa) para dibujar los estilos de siempre.
+const CiudadCanvasModule = function (canvas_width, canvas_height, grid_width, grid_height) {
+  const parent = document.createElement("div");
+  parent.style.height = `${canvas_height}px`;
+  parent.className = "world-grid-parent";
+
+  const createCanvas = () => {
+    const canvas = document.createElement("canvas");
+    canvas.width = canvas_width;
+    canvas.height = canvas_height;
+    canvas.className = "world-grid";
+    parent.appendChild(canvas);
+    return new GridVisualization(canvas_width, canvas_height, grid_width, grid_height, canvas.getContext("2d"), null);
+  };
+  const background = createCanvas();
+  const foreground = createCanvas();
+  document.getElementById("elements").appendChild(parent);
+
+  let lights = [];
+  let lightStyles = [];
+  let lightGreen = [];
+  let carStyle = null;
+
+  // drawLayer modifica cada portrayal (invierte y, agrega colores), así que se arma uno nuevo
+  const portrayal = (style, x, y) => Object.assign({}, style, { x: x, y: y });
+
+  this.render = (data) => {
+    if (data.static) {
+      lights = data.static.lights;
+      lightStyles = data.static.light_styles;
+      lightGreen = new Array(lights.length).fill(0);
+      carStyle = data.static.car;
+      const styles = data.static.styles;
+      background.resetCanvas();
+      background.drawLayer(data.static.cells.map(([x, y, style]) => portrayal(styles[style], x, y)));
+      background.drawGridLines();
+    }
+    for (const [index, green] of data.lights) lightGreen[index] = green;
+
+    const layer = [];
+    lights.forEach((positions, index) => {
+      for (const [x, y] of positions) layer.push(portrayal(lightStyles[lightGreen[index]], x, y));
+    });
+    for (let i = 0; i < data.cars.length; i += 2) layer.push(portrayal(carStyle, data.cars[i], data.cars[i + 1]));
+    foreground.resetCanvas();
+    foreground.drawLayer(layer);
+  };
+
+  this.reset = () => {
+    background.resetCanvas();
+    foreground.resetCanvas();
+  };
+};